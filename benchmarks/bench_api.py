@@ -0,0 +1,186 @@
+"""
+Throughput of cropper against a local fake Harvest API.
+
+Starts a FakeHarvestServer (see fake_harvest.py) and runs every
+scenario in a fresh interpreter, so each one reports its own peak RSS:
+
+ * fetch: pages/s and records/s of the paged time entries, with
+   concurrency 1 and --concurrency
+ * patch: PATCHes/s of update-all-time-entries with --workers
+ * render: rows/s of the listing commands in text and json
+
+The rate limiter is raised so it doesn't hide the client costs and
+the response cache is disabled. Use --json to save the results and
+compare them across releases.
+
+    python benchmarks/bench_api.py [--entries 20000] [--latency 0.005] [--json results.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_harvest import FakeHarvestServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from cropper.cli import VERSION  # noqa: E402
+
+# The ru_maxrss of a child includes the memory of the parent it was
+# spawned from, so every scenario reports the high water mark of its
+# own address space instead
+PEAK_RSS = """
+import atexit, sys
+def _peak_rss():
+    with open('/proc/self/status') as status:
+        peak = [line.split()[1] for line in status if line.startswith('VmHWM')][0]
+    sys.stderr.write('peak_rss_kb ' + peak)
+atexit.register(_peak_rss)
+"""
+
+FETCH = """
+import logging, os, time
+from cropper.harvest import Harvest
+h = Harvest(logging.getLogger('bench'), 'token', '1', concurrency={concurrency},
+            api_url=os.environ['HARVEST_API_URL'], rate_limit=1000000)
+start = time.perf_counter()
+pages = records = 0
+for page in h._iter_pages(*h._time_entries_request()):
+    pages += 1
+    records += len(page)
+print(pages, records, time.perf_counter() - start)
+"""
+
+CLI = 'from cropper.cli import cli; cli(prog_name="cropper")'
+
+RENDER = [
+    ('time-entries', ['time-entries', '1']),
+    ('projects', ['projects']),
+    ('users', ['users']),
+    ('clients', ['clients']),
+    ('tasks', ['tasks', '1'])
+]
+
+
+def run_measured(env, code, *args):
+    """
+    Runs python code in a fresh interpreter, returning the wall time,
+    the peak RSS of that process in MB and its stdout
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', PEAK_RSS + code] + list(args), env=env, cwd=ROOT,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError('{} failed: {}'.format(' '.join(args), result.stderr.strip()))
+    peak = result.stderr.rsplit('peak_rss_kb', 1)[-1]
+    return elapsed, int(peak) / 1024, result.stdout
+
+
+def environment(server):
+    scratch = tempfile.mkdtemp(prefix='cropper-bench-')
+    return dict(
+        os.environ, PYTHONPATH=ROOT, HARVEST_API_URL=server.url,
+        HARVEST_RATE_LIMIT='1000000', HARVEST_TOKEN='token', HARVEST_ID='1',
+        XDG_CACHE_HOME=scratch, XDG_DATA_HOME=scratch)
+
+
+def bench_fetch(server, concurrency):
+    env = environment(server)
+    elapsed, rss, stdout = run_measured(env, FETCH.format(concurrency=concurrency))
+    pages, records, fetch_time = stdout.split()
+    pages, records, fetch_time = int(pages), int(records), float(fetch_time)
+    return {
+        'scenario': 'fetch concurrency={}'.format(concurrency),
+        'pages_per_s': round(pages / fetch_time, 1),
+        'records_per_s': round(records / fetch_time, 1),
+        'seconds': round(fetch_time, 3),
+        'peak_rss_mb': round(rss, 1)
+    }
+
+
+def bench_patch(server, workers):
+    env = environment(server)
+    args = ['--no-cache', 'update-all-time-entries',
+            '-fp', '1', '-ft', '1', '-tp', '2', '-tt', '2', '-w', str(workers)]
+    requests = server.requests
+    elapsed, rss, _ = run_measured(env, CLI, *args)
+    # The fake server ignores the filters, so every entry is patched
+    patches = server.counts['time_entries']
+    return {
+        'scenario': 'patch workers={}'.format(workers),
+        'patches_per_s': round(patches / elapsed, 1),
+        'requests': server.requests - requests,
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(rss, 1)
+    }
+
+
+def bench_render(server, name, command, format):
+    env = environment(server)
+    args = ['--no-cache', '--concurrency', '4'] + command + ['-f', format]
+    elapsed, rss, stdout = run_measured(env, CLI, *args)
+    if format == 'json':
+        rows = len(json.loads(stdout))
+    else:
+        rows = max(0, stdout.count('\n') - 1)
+    return {
+        'scenario': 'render {} {}'.format(name, format),
+        'rows_per_s': round(rows / elapsed, 1),
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(rss, 1)
+    }
+
+
+def print_table(results):
+    columns = ['scenario', 'pages_per_s', 'records_per_s', 'patches_per_s',
+               'rows_per_s', 'seconds', 'peak_rss_mb']
+    widths = [max(len(column), *(len(str(result.get(column, ''))) for result in results))
+              for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for result in results:
+        print('  '.join(str(result.get(column, '')).ljust(width)
+                        for column, width in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=20000, help="Time entries to fetch and render")
+    parser.add_argument('--records', type=int, default=500, help="Projects, users, clients and tasks")
+    parser.add_argument('--patches', type=int, default=500, help="Time entries to PATCH")
+    parser.add_argument('--latency', type=float, default=0.005, help="Seconds before every response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of 429 responses")
+    parser.add_argument('--payload', type=int, default=0, help="Extra bytes per record")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--json', dest='output', default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    options = dict(records=args.records, latency=args.latency, error_rate=args.error_rate,
+                   retry_after=0, payload=args.payload)
+    results = []
+    with FakeHarvestServer(entries=args.entries, **options) as server:
+        for concurrency in sorted({1, args.concurrency}):
+            results.append(bench_fetch(server, concurrency))
+        for name, command in RENDER:
+            for format in ('text', 'json'):
+                results.append(bench_render(server, name, command, format))
+    with FakeHarvestServer(entries=args.patches, **options) as server:
+        results.append(bench_patch(server, args.workers))
+
+    print('cropper {}, python {}'.format(VERSION, sys.version.split()[0]))
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'version': VERSION, 'python': sys.version.split()[0],
+                       'options': vars(args), 'results': results}, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
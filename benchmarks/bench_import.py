@@ -0,0 +1,80 @@
+"""
+Import time budget of the cropper command line.
+
+Runs `python -X importtime -c "import cropper.cli"` several times in
+fresh interpreters and reports the best cumulative import time of
+cropper.cli, the slowest modules it pulls in and the wall time of
+`cropper --help`. Exits with status 1 when the import goes over the
+budget or when any of the modules that must stay lazy is imported.
+
+    python benchmarks/bench_import.py [--runs 5] [--budget-ms 50]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Only the subcommands needing them should import these
+LAZY_MODULES = [
+    'requests', 'sqlite3', 'json', 'csv', 'numpy', 'subprocess',
+    'concurrent.futures', 'cropper.harvest', 'cropper.cache', 'cropper.store',
+    'cProfile', 'tracemalloc'
+]
+
+
+def run(*args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run(
+        [sys.executable] + list(args), env=env, cwd=ROOT,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+
+def importtime():
+    """
+    Returns a dict of module -> (self us, cumulative us)
+    """
+    result = run('-X', 'importtime', '-c', 'import cropper.cli')
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    samples = [importtime() for _ in range(args.runs)]
+    best = min(samples, key=lambda modules: modules['cropper.cli'][1])
+    total_ms = best['cropper.cli'][1] / 1000
+
+    print('import cropper.cli: {:.1f} ms (budget {:.0f} ms)'.format(total_ms, args.budget_ms))
+    print('slowest modules (self time):')
+    for name, (own, _) in sorted(best.items(), key=lambda item: -item[1][0])[:10]:
+        print('  {:>8.1f} ms  {}'.format(own / 1000, name))
+
+    start = time.perf_counter()
+    run('-c', 'from cropper.cli import cli; cli(["--help"])')
+    print('cropper --help: {:.1f} ms wall'.format((time.perf_counter() - start) * 1000))
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in best]
+    if eager:
+        print('FAIL: imported at startup: {}'.format(', '.join(eager)))
+        failed = True
+    if total_ms > args.budget_ms:
+        print('FAIL: import time over budget')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Memory held per time entry, as the dicts decoded from the API and as
+compact TimeEntry records.
+
+Builds synthetic entries like the ones of fake_harvest.py, decodes
+them from JSON as the client does and measures with tracemalloc the
+bytes kept alive by the list of dicts and by the list of records.
+
+    python benchmarks/bench_records.py [--entries 100000] [--payload 0]
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+from fake_harvest import time_entry
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cropper.records import TimeEntryTable  # noqa: E402
+
+
+def pages(count, payload, per_page=100):
+    """
+    Yields the decoded entries page by page, like Harvest does
+    """
+    for first in range(1, count + 1, per_page):
+        page = [time_entry(i, payload) for i in range(first, min(count + 1, first + per_page))]
+        yield from json.loads(json.dumps(page))
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, len(kept)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--payload', type=int, default=0, help="Extra bytes in the notes of every entry")
+    args = parser.parse_args()
+
+    dicts, count = measure(lambda: list(pages(args.entries, args.payload)))
+    records, _ = measure(lambda: TimeEntryTable().compact_all(pages(args.entries, args.payload)))
+
+    print('{} time entries'.format(count))
+    print('  dicts:   {:>10.0f} bytes/entry  {:>8.1f} MB'.format(dicts / count, dicts / 1e6))
+    print('  records: {:>10.0f} bytes/entry  {:>8.1f} MB'.format(records / count, records / 1e6))
+    print('  {:.1f}x smaller'.format(dicts / records))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Micro-benchmark of the rows per second written by the CLI renderers.
+
+Compares the former per row rendering (flatten, a new csv.DictWriter
+and a click.secho call per row) with RowRenderer over the same
+synthetic time entries, writing to /dev/null.
+
+    python benchmarks/bench_render.py [--rows 100000]
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from io import StringIO
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cropper.render import RowRenderer  # noqa: E402
+
+HEADERS = ['id', 'user__name', 'task__id', 'task__name', 'spent_date', 'hours', 'notes']
+TEMPLATE = "{hours:<4.2f} | {task__name:<30s} | {notes}"
+
+
+def flatten(obj, entries):
+    """
+    The per row flattening the CLI used before RowRenderer, kept as
+    the baseline. Converts an object into a dict of simple values
+    based on a list of entries, nested object keys are declared
+    with double underscores, so from {'a': 1, 'b' : { 'b1': 3 }}
+    you can get the 3 as 'b__b1'
+    """
+    result = {}
+
+    for entry in entries:
+        parts = entry.split('__')
+        value_parts = obj[parts[0]]
+        while len(parts) > 1:
+            parts = parts[1:]
+            value_parts = value_parts[parts[0]]
+        result[entry] = value_parts.replace('\r\n',' ') if type(value_parts) is str else value_parts
+
+    return result
+
+
+def time_entry(i):
+    return {
+        'id': i,
+        'spent_date': '2019-03-{:02d}'.format(1 + i % 28),
+        'hours': 1.25,
+        'notes': 'Working on the feature #{}\r\nwith a second line'.format(i),
+        'is_running': False,
+        'user': {'id': i % 40, 'name': 'User {}'.format(i % 40)},
+        'project': {'id': 1000 + i % 15, 'name': 'Project {}'.format(i % 15)},
+        'task': {'id': 100 + i % 8, 'name': 'Task {}'.format(i % 8)},
+    }
+
+
+def legacy(entries, out, template=None):
+    for obj in entries:
+        flattened = flatten(obj, HEADERS)
+        if template:
+            result = template.format(**flattened)
+        else:
+            with StringIO(newline='') as writer:
+                csv_writer = csv.DictWriter(writer, fieldnames=HEADERS)
+                csv_writer.writerow(flattened)
+                result = writer.getvalue()
+        click.secho(result.strip('\r\n'), fg='green', file=out)
+
+
+def renderer(entries, out, template=None):
+    RowRenderer(HEADERS, template=template, stream=out).write_all(
+        entries, print_headers=False)
+
+
+def measure(name, fn, entries, template=None):
+    with open(os.devnull, 'w') as out:
+        start = time.perf_counter()
+        fn(entries, out, template)
+        elapsed = time.perf_counter() - start
+    print('{:<22s} {:>12,.0f} rows/s'.format(name, len(entries) / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    entries = [time_entry(i) for i in range(args.rows)]
+    measure('legacy csv', legacy, entries)
+    measure('renderer csv', renderer, entries)
+    measure('legacy template', legacy, entries, TEMPLATE)
+    measure('renderer template', renderer, entries, TEMPLATE)
+
+
+if __name__ == '__main__':
+    main()
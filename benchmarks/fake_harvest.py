@@ -0,0 +1,273 @@
+"""
+A local stand-in for the Harvest v2 API serving synthetic data.
+
+It answers the paged /time_entries, /projects, /users, /clients and
+/task_assignments endpoints, single records, /users/me, /company and
+time entry PATCHes, with a configurable latency, number of records,
+rate of 429 responses and payload size. Time entries come newest
+first and can be filtered by date with from and to, like Harvest
+does, any other filter is ignored.
+
+Run it on its own and point cropper to it with --api-url:
+
+    python benchmarks/fake_harvest.py --port 8000 --entries 40000
+    cropper --api-url http://127.0.0.1:8000/api/v2/ -t x -a 1 users
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def time_entry(i, payload=0):
+    return {
+        'id': i,
+        'spent_date': '2019-{:02d}-{:02d}'.format(1 + i % 12, 1 + i % 28),
+        'hours': round(0.25 * (1 + i % 16), 2),
+        'notes': 'Synthetic entry {} {}'.format(i, 'x' * payload),
+        'is_locked': False,
+        'is_closed': False,
+        'is_billed': i % 3 == 0,
+        'is_running': i % 1000 == 0,
+        'billable': i % 2 == 0,
+        'budgeted': False,
+        'billable_rate': 100.0,
+        'cost_rate': 50.0,
+        'created_at': '2019-01-01T10:00:00Z',
+        'updated_at': '2019-01-02T10:00:00Z',
+        'user': {'id': 1 + i % 40, 'name': 'User {}'.format(1 + i % 40)},
+        'client': {'id': 1 + i % 10, 'name': 'Client {}'.format(1 + i % 10), 'currency': 'EUR'},
+        'project': {'id': 1 + i % 25, 'name': 'Project {}'.format(1 + i % 25), 'code': 'P{}'.format(i % 25)},
+        'task': {'id': 1 + i % 12, 'name': 'Task {}'.format(1 + i % 12)},
+        'user_assignment': {'id': i % 97, 'is_project_manager': False, 'is_active': True},
+        'task_assignment': {'id': i % 89, 'billable': True, 'is_active': True},
+        'invoice': None,
+        'external_reference': None
+    }
+
+
+def project(i, payload=0):
+    return {
+        'id': i, 'name': 'Project {}'.format(i), 'code': 'P{}'.format(i),
+        'is_active': i % 4 != 0, 'is_billable': True, 'budget': None,
+        'notes': 'x' * payload, 'created_at': '2019-01-01T10:00:00Z',
+        'updated_at': '2019-01-02T10:00:00Z',
+        'client': {'id': 1 + i % 10, 'name': 'Client {}'.format(1 + i % 10), 'currency': 'EUR'}
+    }
+
+
+def user(i, payload=0):
+    return {
+        'id': i, 'first_name': 'First{}'.format(i), 'last_name': 'Last{}'.format(i),
+        'email': 'user{}@example.com'.format(i), 'is_admin': i == 1, 'is_active': i % 5 != 0,
+        'timezone': 'Europe/Madrid', 'created_at': '2019-01-01T10:00:00Z',
+        'updated_at': '2019-01-02T10:00:00Z', 'roles': ['x' * payload]
+    }
+
+
+def client(i, payload=0):
+    return {
+        'id': i, 'name': 'Client {}'.format(i), 'is_active': i % 3 != 0,
+        'address': 'x' * payload, 'currency': 'EUR',
+        'created_at': '2019-01-01T10:00:00Z', 'updated_at': '2019-01-02T10:00:00Z'
+    }
+
+
+def task_assignment(i, payload=0):
+    return {
+        'id': i, 'billable': True, 'is_active': i % 6 != 0, 'hourly_rate': 100.0,
+        'created_at': '2019-01-01T10:00:00Z', 'updated_at': '2019-01-02T10:00:00Z',
+        'project': {'id': 1 + i % 25, 'name': 'Project {}'.format(1 + i % 25), 'code': 'P{}'.format(i % 25)},
+        'task': {'id': 1 + i % 12, 'name': 'Task {}'.format(1 + i % 12)}
+    }
+
+
+RESOURCES = {
+    'time_entries': time_entry,
+    'projects': project,
+    'users': user,
+    'clients': client,
+    'task_assignments': task_assignment
+}
+
+
+class FakeHarvestServer(object):
+    """
+    Serves synthetic Harvest API responses from a background thread
+    """
+
+    def __init__(self, entries=10000, records=200, latency=0.0, error_rate=0.0,
+                 retry_after=1, payload=0, port=0):
+        """
+        Parameters:
+            entries (int): number of time entries
+            records (int): number of projects, users, clients and
+                           task assignments
+            latency (float): seconds to wait before every response
+            error_rate (float): fraction of requests answered with 429
+            retry_after (int): Retry-After seconds of the 429 responses
+            payload (int): extra bytes of text on every record
+            port (int): the port to listen on, a free one by default
+        """
+        self.counts = {name: records for name in RESOURCES}
+        self.counts['time_entries'] = entries
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.payload = payload
+        self.requests = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self._entries_by_date = None
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/api/v2/'.format(self.server.server_address[1])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def entries_between(self, _from=None, to=None):
+        """
+        Returns the time entry identifiers spent between two dates,
+        the most recent first
+        """
+        with self.lock:
+            if self._entries_by_date is None:
+                dates = sorted((time_entry(i)['spent_date'], i)
+                               for i in range(1, self.counts['time_entries'] + 1))
+                self._entries_by_date = ([date for date, _ in dates], [i for _, i in dates])
+        dates, ids = self._entries_by_date
+        first = bisect_left(dates, _from) if _from else 0
+        last = bisect_right(dates, to) if to else len(dates)
+        return ids[first:last][::-1]
+
+    def page(self, resource, page, per_page, _from=None, to=None):
+        build = RESOURCES[resource]
+        if resource == 'time_entries':
+            ids = self.entries_between(_from, to)
+        else:
+            ids = range(1, self.counts[resource] + 1)
+        total = len(ids)
+        first = (page - 1) * per_page
+        last = min(total, page * per_page)
+        return {
+            resource: [build(i, self.payload) for i in ids[first:last]],
+            'per_page': per_page,
+            'total_pages': max(1, -(-total // per_page)),
+            'total_entries': total,
+            'page': page,
+            'next_page': page + 1 if last < total else None,
+            'previous_page': page - 1 if page > 1 else None
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, body, status=200):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def throttle(self):
+                with fake.lock:
+                    fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake.error_rate and random.random() < fake.error_rate:
+                    with fake.lock:
+                        fake.throttled += 1
+                    self.send_response(429)
+                    self.send_header('Retry-After', str(fake.retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return True
+                return False
+
+            def parse(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                parts = [part for part in url.path.split('/') if part][2:]
+                return parts, query
+
+            def do_GET(self):
+                if self.throttle():
+                    return
+                parts, query = self.parse()
+                if parts == ['users', 'me.json'] or parts == ['users', 'me']:
+                    return self.send_json(user(1))
+                if parts == ['company']:
+                    return self.send_json({'name': 'Fake Company', 'is_active': True})
+                resource = parts[-1] if parts else ''
+                if resource in RESOURCES:
+                    return self.send_json(fake.page(
+                        resource, int(query.get('page', 1)), int(query.get('per_page', 100)),
+                        query.get('from'), query.get('to')))
+                if len(parts) == 2 and parts[0] in RESOURCES and parts[1].isdigit():
+                    return self.send_json(RESOURCES[parts[0]](int(parts[1]), fake.payload))
+                self.send_json({'message': 'Not found'}, 404)
+
+            def do_PATCH(self):
+                if self.throttle():
+                    return
+                parts, query = self.parse()
+                if len(parts) != 2 or parts[0] != 'time_entries' or not parts[1].isdigit():
+                    return self.send_json({'message': 'Not found'}, 404)
+                entry = time_entry(int(parts[1]), fake.payload)
+                entry['project']['id'] = int(query.get('project_id', entry['project']['id']))
+                entry['task']['id'] = int(query.get('task_id', entry['task']['id']))
+                entry['notes'] = query.get('notes', entry['notes'])
+                self.send_json(entry)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--entries', type=int, default=10000, help="Number of time entries")
+    parser.add_argument('--records', type=int, default=200, help="Number of projects, users, clients and tasks")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds before every response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of 429 responses")
+    parser.add_argument('--payload', type=int, default=0, help="Extra bytes per record")
+    args = parser.parse_args()
+
+    server = FakeHarvestServer(args.entries, args.records, args.latency,
+                               args.error_rate, payload=args.payload, port=args.port)
+    print('Serving a fake Harvest API at {}'.format(server.url))
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+Account = namedtuple('Account', ['name', 'account_id', 'token'])
+
+AccountTiming = namedtuple('AccountTiming', ['account_id', 'results', 'first_result', 'elapsed', 'error'])
+
+
+def parse_account(value):
+    """
+    Reads an account given as ACCOUNT_ID:TOKEN
+    """
+    account_id, separator, token = value.partition(':')
+    if not separator or not account_id.strip() or not token.strip():
+        raise ValueError('Accounts are given as ACCOUNT_ID:TOKEN, got {}'.format(value))
+    return Account(account_id.strip(), account_id.strip(), token.strip())
+
+
+def load_accounts(path):
+    """
+    Reads the accounts of an INI file with a section per account
+    holding its account_id and token:
+
+        [acme]
+        account_id = 123456
+        token = ...
+
+    Parameters:
+        path (str): the accounts file
+    """
+    import configparser
+    parser = configparser.ConfigParser()
+    if not parser.read(path):
+        raise ValueError('Could not read the accounts file {}'.format(path))
+    accounts = []
+    for name in parser.sections():
+        section = parser[name]
+        if not section.get('account_id') or not section.get('token'):
+            raise ValueError('The account {} needs an account_id and a token'.format(name))
+        accounts.append(Account(name, section['account_id'], section['token']))
+    return accounts
+
+
+class FanOut(object):
+    """
+    Runs the same query against several Harvest accounts at once,
+    each one with its own client, connections and rate limiter, and
+    merges their results into a single stream as they arrive, every
+    object tagged with the account_id it comes from
+    """
+
+    def __init__(self, harvests, buffer_size=1000):
+        """
+        Parameters:
+            harvests (list): a Harvest client per account
+            buffer_size (int): how many results can wait to be read
+                               before the accounts stop fetching
+        """
+        self.harvests = list(harvests)
+        self.buffer_size = buffer_size
+        self.timings = []
+
+    def iter(self, method, *args, **kwargs):
+        """
+        Yields the results of calling a method returning an iterable
+        of objects, like iter_users, on every account. An account
+        that fails doesn't stop the rest, its error is kept in the
+        timings.
+
+        Parameters:
+            method (str): the name of the Harvest method to call
+        """
+        results = queue.Queue(self.buffer_size)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def fetch(harvest):
+            start = time.monotonic()
+            first = None
+            count = 0
+            error = None
+            try:
+                for obj in getattr(harvest, method)(*args, **kwargs):
+                    if first is None:
+                        first = time.monotonic() - start
+                    obj['account_id'] = harvest.accountid
+                    if not put(obj):
+                        return
+                    count += 1
+            except Exception as e:
+                error = e
+            finally:
+                self.timings.append(AccountTiming(
+                    harvest.accountid, count, first, time.monotonic() - start, error))
+                put(done)
+
+        threads = [threading.Thread(target=fetch, args=(harvest,), daemon=True)
+                   for harvest in self.harvests]
+        for thread in threads:
+            thread.start()
+        try:
+            pending = len(threads)
+            while pending:
+                item = results.get()
+                if item is done:
+                    pending -= 1
+                else:
+                    yield item
+        finally:
+            stop.set()
+
+    @property
+    def failed(self):
+        """
+        The timings of the accounts whose query failed
+        """
+        return [timing for timing in self.timings if timing.error]
+
+    def iter_clients(self, *args, **kwargs):
+        return self.iter('iter_clients', *args, **kwargs)
+
+    def iter_users(self, *args, **kwargs):
+        return self.iter('iter_users', *args, **kwargs)
+
+    def iter_projects(self, *args, **kwargs):
+        return self.iter('iter_projects', *args, **kwargs)
+
+    def iter_task_assignments(self, *args, **kwargs):
+        return self.iter('iter_task_assignments', *args, **kwargs)
+
+    def iter_time_entries(self, *args, **kwargs):
+        return self.iter('iter_time_entries', *args, **kwargs)
+
+    def format_timings(self):
+        """
+        Returns the timings of every account as a table
+        """
+        lines = ['{:<12}  {:>8}  {:>8}  {:>8}  {}'.format('account', 'results', 'first s', 'total s', 'status')]
+        for timing in sorted(self.timings, key=lambda timing: str(timing.account_id)):
+            lines.append('{:<12}  {:>8}  {:>8}  {:>8.2f}  {}'.format(
+                timing.account_id, timing.results,
+                '-' if timing.first_result is None else '{:.2f}'.format(timing.first_result),
+                timing.elapsed, 'error: {}'.format(timing.error) if timing.error else 'ok'))
+        return '\n'.join(lines)
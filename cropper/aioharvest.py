@@ -0,0 +1,290 @@
+import asyncio
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from cropper import jsonlib
+from cropper.harvest import BaseHarvest
+
+
+class AsyncHarvest(BaseHarvest):
+    """
+    An asyncio version of Harvest, with the same public methods
+    as coroutines and async iterators for the paged endpoints.
+
+    It needs the optional aiohttp dependency, install it with
+    pip install harvest-cropper[async]. It can be used as an async
+    context manager to close its connection pool on exit.
+    """
+
+    def __init__(self, logger, token, accountid, concurrency=1, session=None,
+                 api_url=None, rate_limit=None, connect_timeout=10, read_timeout=60):
+        """
+        Parameters:
+            logger (logging): a logger to use
+            token (str): the auth token
+            accountid (int): the account identifier
+            concurrency (int): how many pages of a paged endpoint
+                               can be requested at the same time
+            session (aiohttp.ClientSession): a session to reuse, by
+                                             default one is created
+                                             on the first request
+            api_url (str): the API base url, to use a stand-in server
+            rate_limit (int): requests allowed every RATE_PERIOD
+                              seconds, RATE_LIMIT by default
+            connect_timeout (float): seconds to wait for a connection
+            read_timeout (float): seconds to wait for the server
+                                  between bytes of the response
+        """
+        if aiohttp is None:
+            raise ImportError(
+                'AsyncHarvest needs aiohttp, install harvest-cropper[async]')
+        super().__init__(logger, accountid, concurrency, api_url, rate_limit)
+        self.headers = self._auth_headers(token, accountid)
+        self._session = session
+        # Like HTTPTransport, a stalled request fails and is retried
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+
+    @property
+    def session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=max(self.concurrency, 10))
+            self._session = aiohttp.ClientSession(
+                connector=connector, headers=self.headers)
+        return self._session
+
+    async def close(self):
+        """
+        Closes the connection pool
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _request(self, method, endpoint, parameters={}):
+        """
+        Private coroutine to send a request to a Harvest API endpoint,
+        pacing it with the instance rate limiter and retrying
+        throttled, failed and unreachable requests
+
+        Parameters:
+            method (str): the HTTP method
+            endpoint (str): the API endpoint url section
+            parameters (dict): the parameters to add to the request
+        """
+        url = self.API_URL + endpoint
+        attempt = 0
+        while True:
+            await self.limiter.acquire_async()
+            started = time.perf_counter()
+            try:
+                # A session given by the caller doesn't have them
+                async with self.session.request(
+                        method, url, params=parameters, headers=self.headers, timeout=self.timeout) as r:
+                    body = await r.read()
+                    # Counted as sent, the body is already decompressed
+                    size = r.content_length if r.content_length is not None else len(body)
+                    self._notify(method, endpoint, parameters, r.status, started,
+                                 size, attempt)
+                    if r.status == 200:
+                        return jsonlib.loads(body)
+                    text = await r.text()
+                    self.logger.debug(text)
+                    error = self._error(endpoint, r.status, r.headers, text)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._notify(method, endpoint, parameters, None, started, 0, attempt)
+                error = self._connection_error(endpoint, e)
+
+            delay = self._retry_delay(error, attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _call(self, endpoint, parameters={}):
+        """
+        Private coroutine to call a Harvest API endpoint
+
+        Parameters:
+            endpoint (str): the API endpoint url section
+            parameters (dict): the parameters to add to the GET request
+        """
+        self.logger.debug(
+            'Making a request to the endpoint {} with parameters: {}'.format(endpoint, str(parameters)))
+        return await self._request('GET', endpoint, parameters)
+
+    async def _iter_pages(self, endpoint, objectid, parameters={}):
+        """
+        Private async generator that yields the list of objects of
+        every page of a paged endpoint, in page order, keeping at most
+        `concurrency` pages in flight
+
+        Parameters:
+            endpoint (str): the API endpoint url section
+            objectid (str): the key of the array to extract from
+                            the returning JSON
+            parameters (dict): the parameters to add to the GET request
+        """
+        first_request = await self._call(
+            endpoint, self._page_parameters(parameters, 1))
+        total_pages = self._total_pages(first_request)
+        yield first_request[objectid]
+        del first_request
+
+        futures = self._in_flight(
+            self._next_pages(endpoint, parameters, 1, total_pages),
+            lambda *call: asyncio.ensure_future(self._call(*call)))
+        try:
+            for future in futures:
+                yield (await future)[objectid]
+        finally:
+            futures.close()
+
+    async def _iter_paged_results(self, endpoint, objectid, parameters={}):
+        """
+        Private async generator that yields one by one all the results
+        of a paged endpoint, requesting the pages as they are consumed
+        """
+        async for page in self._iter_pages(endpoint, objectid, parameters):
+            for result in page:
+                yield result
+
+    async def _filter(self, results, matches):
+        async for result in results:
+            if matches(result):
+                yield result
+
+    async def _get_paged_results(self, endpoint, objectid, parameters={}):
+        """
+        Private coroutine to get all the results of a paged endpoint
+        """
+        return [result async for result in self._iter_paged_results(
+            endpoint, objectid, parameters)]
+
+    async def check(self):
+        """
+        Just returns information about the requesting user
+        """
+        return await self._call('/users/me.json')
+
+    async def projects(self, active, client=None, updated_since=None):
+        """
+        Gets a list of projects, see Harvest.projects
+        """
+        return await self._get_paged_results(
+            *self._projects_request(active, client, updated_since))
+
+    def iter_projects(self, active, client=None, updated_since=None):
+        """
+        Async iterator over the projects, see Harvest.projects
+        """
+        return self._iter_paged_results(
+            *self._projects_request(active, client, updated_since))
+
+    async def project(self, project_id):
+        """
+        Gets details of an specific project
+
+        Parameters:
+            project_id (int): the project identifier
+        """
+        return await self._call('/projects/{}'.format(project_id))
+
+    async def company(self):
+        """
+        Gets company details associated to the Harvest account
+        """
+        return await self._call('/company')
+
+    async def clients(self, active="all", updated_since=None):
+        """
+        Gets a list of clients, see Harvest.clients
+        """
+        return await self._get_paged_results(
+            *self._clients_request(active, updated_since))
+
+    def iter_clients(self, active="all", updated_since=None):
+        """
+        Async iterator over the clients, see Harvest.clients
+        """
+        return self._iter_paged_results(
+            *self._clients_request(active, updated_since))
+
+    async def users(self, active="all", updated_since=None):
+        """
+        Gets a list of users, see Harvest.users
+        """
+        return await self._get_paged_results(
+            *self._users_request(active, updated_since))
+
+    def iter_users(self, active="all", updated_since=None):
+        """
+        Async iterator over the users, see Harvest.users
+        """
+        return self._iter_paged_results(
+            *self._users_request(active, updated_since))
+
+    async def task_assignments(self, projectid=None):
+        """
+        Gets the list of tasks associated to a project, or of all
+        the projects if no project is given
+
+        Parameters:
+            projectid (int): the project identifier
+        """
+        return await self._get_paged_results(
+            *self._task_assignments_request(projectid))
+
+    def iter_task_assignments(self, projectid=None):
+        """
+        Async iterator over the tasks associated to a project
+        """
+        return self._iter_paged_results(
+            *self._task_assignments_request(projectid))
+
+    async def time_entries(self, **kwargs):
+        """
+        Gets the list of timesheet entries matching the filters
+        given as keyword arguments, see Harvest.time_entries
+        """
+        return [entry async for entry in self.iter_time_entries(**kwargs)]
+
+    def iter_time_entries(self, **kwargs):
+        """
+        Async iterator over the timesheet entries matching the
+        filters given as keyword arguments
+        """
+        results = self._iter_paged_results(
+            *self._time_entries_request(**kwargs))
+        matches = self._time_entries_filter(**kwargs)
+        return self._filter(results, matches) if matches else results
+
+    async def time_entry(self, time_entry_id):
+        """
+        Retrieves a single time entry
+
+        Parameters:
+            time_entry_id(int) Entry identifier
+        """
+        return await self._call('/time_entries/{}'.format(time_entry_id))
+
+    async def update_time_entry(self, time_entry_id, project_id, task_id, notes=None):
+        """
+        Updates a timesheet entry to be associated to a project and task
+
+        Parameters
+            time_entry_id (int): the time entry identifier
+            project_id (int): the project identifier
+            task_id (int): the task identifier
+        """
+        endpoint, params = self._update_time_entry_request(
+            time_entry_id, project_id, task_id, notes)
+        self.logger.debug('Calling PATCH for updating the time entry')
+        return await self._request('PATCH', endpoint, params)
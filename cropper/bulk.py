@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import namedtuple
+
+TimeEntryUpdate = namedtuple(
+    'TimeEntryUpdate', ['time_entry_id', 'project_id', 'task_id', 'notes'])
+
+BulkResult = namedtuple('BulkResult', ['updated', 'failed', 'elapsed'])
+
+
+class BulkUpdater(object):
+    """
+    Runs many time entry updates concurrently, the pace of requests
+    is kept under the Harvest API rate limit by the client limiter
+    """
+
+    # Usual seconds Harvest takes to answer an update
+    LATENCY = 0.5
+
+    def __init__(self, harvest, concurrency=4, on_result=None):
+        """
+        Parameters:
+            harvest (Harvest): the client used to send the updates
+            concurrency (int): how many updates can be in flight
+            on_result (callable): called after every update with the
+                                  update, the API response (None on
+                                  failure) and the exception if any
+        """
+        self.harvest = harvest
+        self.concurrency = max(1, concurrency)
+        self.on_result = on_result
+
+    def estimate(self, count, latency=None):
+        """
+        Returns the expected duration in seconds of `count` updates,
+        the time waiting for the rate limit plus the time waiting
+        for the responses, shared by the workers
+
+        Parameters:
+            count (int): the number of updates to run
+            latency (float): seconds every update takes, LATENCY
+                             by default
+        """
+        latency = self.LATENCY if latency is None else latency
+        return self.harvest.limiter.estimate(count) + count * latency / self.concurrency
+
+    def run(self, updates):
+        """
+        Sends all the updates, collecting the failures instead of
+        stopping at the first one
+
+        Parameters:
+            updates (iterable): TimeEntryUpdate objects
+
+        Returns a BulkResult with the updated identifiers, the list of
+        (time_entry_id, exception) failures and the elapsed seconds
+        """
+        updates = iter(updates)
+        lock = threading.Lock()
+        updated = []
+        failed = []
+
+        def worker():
+            while True:
+                with lock:
+                    update = next(updates, None)
+                if update is None:
+                    return
+                try:
+                    result = self.harvest.update_time_entry(
+                        update.time_entry_id, update.project_id,
+                        update.task_id, update.notes)
+                    error = None
+                except Exception as e:
+                    result = None
+                    error = e
+                with lock:
+                    if error is None:
+                        updated.append(update.time_entry_id)
+                    else:
+                        failed.append((update.time_entry_id, error))
+                    if self.on_result:
+                        self.on_result(update, result, error)
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=worker, daemon=True)
+                   for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return BulkResult(updated, failed, time.monotonic() - start)
@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+
+def user_cache_dir():
+    """
+    Returns the folder where cropper keeps its cache files,
+    following the XDG base directory convention
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'cropper')
+
+
+class ResponseCache(object):
+    """
+    A SQLite store of Harvest API responses, with their validators
+    so stale responses can be revalidated with conditional requests
+    """
+
+    FILENAME = 'responses.sqlite'
+
+    def __init__(self, path=None):
+        """
+        Parameters:
+            path (str): the SQLite database file, by default it is
+                        stored at the user cache folder
+        """
+        self.path = path or os.path.join(user_cache_dir(), self.FILENAME)
+        self.lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False)
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )''')
+        return self._connection
+
+    @staticmethod
+    def key(accountid, endpoint, parameters):
+        """
+        Builds the cache key of a request
+
+        Parameters:
+            accountid (str): the Harvest account the request is sent to
+            endpoint (str): the API endpoint url section
+            parameters (dict): the GET parameters
+        """
+        return '{}:{}?{}'.format(
+            accountid, endpoint, urlencode(sorted(parameters.items())))
+
+    def get(self, key):
+        """
+        Returns a dict with the body, etag, last_modified and age of
+        a stored response, or None if there is no response stored
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?',
+                (key,)).fetchone()
+        if row is None:
+            return None
+        body, etag, last_modified, stored_at = row
+        return {
+            'body': body,
+            'etag': etag,
+            'last_modified': last_modified,
+            'age': time.time() - stored_at
+        }
+
+    def set(self, key, endpoint, body, etag=None, last_modified=None):
+        """
+        Stores a fresh response
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(key, endpoint, body, etag, last_modified, stored_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (key, endpoint, body, etag, last_modified, time.time()))
+
+    def hit(self, key, revalidated=False):
+        """
+        Records a response served from the cache, restarting its
+        age when it was revalidated against the server
+        """
+        with self.lock, self.connection:
+            if revalidated:
+                self.connection.execute(
+                    'UPDATE responses SET hits = hits + 1, stored_at = ? WHERE key = ?',
+                    (time.time(), key))
+            else:
+                self.connection.execute(
+                    'UPDATE responses SET hits = hits + 1 WHERE key = ?', (key,))
+
+    def clear(self):
+        """
+        Removes all the stored responses, returning how many there were
+        """
+        with self.lock, self.connection:
+            return self.connection.execute('DELETE FROM responses').rowcount
+
+    def stats(self):
+        """
+        Returns a list of dicts with the number of responses, hits,
+        bytes and oldest response age for every endpoint
+        """
+        with self.lock:
+            rows = self.connection.execute('''
+                SELECT endpoint, COUNT(*), SUM(hits), SUM(LENGTH(body)), MIN(stored_at)
+                FROM responses GROUP BY endpoint ORDER BY endpoint''').fetchall()
+        now = time.time()
+        return [{
+            'endpoint': endpoint,
+            'responses': count,
+            'hits': hits,
+            'bytes': size,
+            'oldest': int(now - oldest)
+        } for endpoint, count, hits, size, oldest in rows]
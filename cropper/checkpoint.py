@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlencode
+
+from cropper import jsonlib
+from cropper.cache import user_cache_dir
+
+
+class CheckpointStore(object):
+    """
+    Spools the results of paged requests to disk, one JSON object per
+    line, recording after every page how far it got. If the same
+    request is interrupted, the next time it is made the saved
+    results are read back from disk and only the pages left are
+    requested. The files of a request are removed once all of its
+    results have been read. Results older than max_age are thrown
+    away instead of mixing them with fresh ones.
+    """
+
+    # Seconds the results of an interrupted request can be resumed
+    MAX_AGE = 24 * 3600
+
+    def __init__(self, folder=None, logger=None, max_age=None):
+        """
+        Parameters:
+            folder (str): where to keep the spooled results, by
+                          default in the user cache folder
+            logger (logging): a logger to use
+            max_age (float): seconds the spooled results can be
+                             resumed, MAX_AGE by default
+        """
+        self.folder = folder or os.path.join(user_cache_dir(), 'checkpoints')
+        self.logger = logger
+        self.max_age = self.MAX_AGE if max_age is None else max_age
+
+    def _paths(self, accountid, endpoint, parameters, fields=None):
+        query = urlencode(sorted(parameters.items()))
+        key = hashlib.sha1('{}|{}?{}|{}'.format(
+            accountid, endpoint, query, ','.join(fields or [])).encode('utf-8')).hexdigest()
+        base = os.path.join(self.folder, key[:24])
+        return base + '.ndjson', base + '.progress'
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+
+    @staticmethod
+    def _load(progress_path):
+        """
+        Returns the progress of a request or None if it has none
+        """
+        try:
+            with open(progress_path) as progress:
+                return json.load(progress)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _save(progress_path, state):
+        # Replaced at once so a crash never leaves half of it
+        tmp = progress_path + '.tmp'
+        with open(tmp, 'w') as progress:
+            json.dump(state, progress)
+        os.replace(tmp, progress_path)
+
+    def iter_results(self, harvest, endpoint, objectid, parameters={}):
+        """
+        Yields all the results of a paged endpoint, the ones spooled
+        by a previous interrupted run first
+
+        Parameters:
+            harvest (Harvest): the client requesting the pages
+            endpoint (str): the API endpoint url section
+            objectid (str): the key of the array to extract from
+                            the returning JSON
+            parameters (dict): the parameters to add to the GET request
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        # The spooled results are projected, so other fields mean other results
+        projection = harvest.projection
+        spool_path, progress_path = self._paths(
+            harvest.accountid, endpoint, parameters, projection.fields if projection else None)
+        state = self._load(progress_path)
+        if state and time.time() - state.get('created', 0) > self.max_age:
+            self._log('Discarding the results of {} saved {:.0f} hours ago'.format(
+                endpoint, (time.time() - state.get('created', 0)) / 3600))
+            os.remove(progress_path)
+            state = None
+
+        if state and os.path.exists(spool_path):
+            self._log('Resuming {} after page {}, {} results already saved'.format(
+                endpoint, state['page'], state['results']))
+            with open(spool_path, 'r+', encoding='utf-8') as spool:
+                # Forget whatever was written after the last good page
+                spool.truncate(state['offset'])
+            with open(spool_path, encoding='utf-8') as spool:
+                for line in spool:
+                    yield jsonlib.loads(line)
+        else:
+            state = {'endpoint': endpoint, 'page': 0, 'offset': 0, 'results': 0, 'created': time.time()}
+            # Whatever was spooled without progress is not to be trusted
+            with open(spool_path, 'w', encoding='utf-8'):
+                pass
+
+        with open(spool_path, 'a', encoding='utf-8') as spool:
+            pages = harvest._iter_pages(endpoint, objectid, parameters, start_page=state['page'] + 1)
+            for page in pages:
+                spool.write(''.join(jsonlib.dumps(result) + '\n' for result in page))
+                spool.flush()
+                os.fsync(spool.fileno())
+                state['page'] += 1
+                state['offset'] = spool.tell()
+                state['results'] += len(page)
+                self._save(progress_path, state)
+                yield from page
+
+        os.remove(progress_path)
+        os.remove(spool_path)
+
+    def clear(self):
+        """
+        Removes every spooled request, returns how many there were
+        """
+        if not os.path.isdir(self.folder):
+            return 0
+        removed = 0
+        for name in os.listdir(self.folder):
+            if name.endswith('.progress'):
+                removed += 1
+            os.remove(os.path.join(self.folder, name))
+        return removed
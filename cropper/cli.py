@@ -1,92 +1,271 @@
-import sys, traceback
+# Keep the module imports light, `cropper --help` and shell completion
+# only need click. Everything else is imported by the commands using it,
+# check benchmarks/bench_import.py before adding anything here.
 import click
 from click import ClickException
 import logging
-import json
-import csv
+import os
 from datetime import date
 
-try:
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO
-
-from cropper.harvest import Harvest
+from cropper.report import GROUPS
 
 from cropper import VERSION
 
-logging.basicConfig(
-    level=logging.WARNING,
-    format=' %(asctime)s [%(levelname)-7s] %(message)s',
-    datefmt='%I:%M:%S %p')
 logger = logging.getLogger('harvest_mapper')
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
-def flatten(obj, entries):
+def timed(entries):
     """
-    Converts an object into a list of simple value pairs
-    based on a list of entries to get and using the
-    rule of nested object keys are declared as double underscores
-    So to fro {'a': 1, 'b' : { 'b1': 3 }} you can get the 3 as 'b__b1'
+    Wraps the objects to output so --stats can tell the time spent
+    writing them from the time spent waiting for the API
     """
+    ctx = click.get_current_context(silent=True)
+    stats = ctx.obj.get('stats') if ctx and ctx.obj else None
+    return stats.timed(entries) if stats else entries
 
-    result = {}
+def show_error(ctx, error):
+    """
+    Prints the error a command failed with, flagging the failure
+    for shell and batch, which run the command in the same context
+    """
+    click.secho(str(error), fg='red')
+    ctx.obj['failed'] = True
 
-    for entry in entries:
-        parts = entry.split('__')
-        value_parts = obj[parts[0]]
-        while len(parts) > 1:
-            parts = parts[1:]
-            value_parts = value_parts[parts[0]]
-        result[entry] = value_parts.replace('\r\n',' ') if type(value_parts) is str else value_parts
+def print_list_objs(entries, headers, print_active=False, print_headers=True, template=None, optional=False):
+    from cropper.render import RowRenderer
+    renderer = RowRenderer(headers, print_active, template, optional=optional)
+    renderer.write_all(timed(entries), print_headers)
 
-    return result
+DATE = click.DateTime(formats=['%Y-%m-%d'])
 
-def print_obj(obj, entries, print_active=False, template=None):
+def iso_date(value):
     """
-    Returns a valid CSV row for an object and a list
-    of key values to search from, it accepts nested keys using
-    the double underscore
+    Formats a date option as the API expects it, if given
     """
-    
-    if print_active:
-        color = "green" if obj['is_active'] else "yellow"
-    else:
-        color = "green"
+    return value.date().isoformat() if value else None
+
+def api_source(ctx):
+    """
+    Returns the object to run list queries with, the Harvest client
+    or the fan-out over every account when querying several
+    """
+    return ctx.obj.get('fanout') or ctx.obj['harvest']
+
+def pool_for_workers(ctx, workers):
+    """
+    Keeps a connection per worker in the pool of the Harvest client,
+    whatever the pool size it was created with
+    """
+    grow_pool = getattr(ctx.obj['harvest'].transport, 'grow_pool', None)
+    if grow_pool:
+        grow_pool(workers)
 
-    flattened = flatten(obj,entries)
-    if template:
-        result = template.format(**flattened)
+def print_update(describe):
+    """
+    Returns the on_result callback of a bulk update printing the
+    outcome of every update, the updated entries with describe
+    """
+    def on_result(update, result, error):
+        tid = update.time_entry_id
+        if error:
+            click.secho(f'Time entry {tid} failed: {error}', fg="red")
+        elif result:
+            click.secho(f'Time entry {tid} {describe(update)}', fg="green")
+    return on_result
+
+def print_bulk_result(result, retry=None):
+    """
+    Prints the summary of a bulk update, with the entries that
+    failed and how to retry them if given
+    """
+    total = len(result.updated) + len(result.failed)
+    throughput = total / result.elapsed if result.elapsed else 0
+    click.secho(f'{len(result.updated)} updated, {len(result.failed)} failed in {result.elapsed:.1f}s ({throughput:.1f} entries/s)',
+                fg="green" if not result.failed else "yellow", err=True)
+    if result.failed:
+        failed_ids = ','.join(str(tid) for tid, _ in result.failed)
+        click.secho(f'Failed time entries: {failed_ids}', fg='red')
+        if retry:
+            click.secho(retry, fg='red')
     else:
-        with StringIO(newline='') as writer:
-            csv_writer = csv.DictWriter(writer, fieldnames=entries)
-            csv_writer.writerow(flattened)
-            result = writer.getvalue()
-    
-    click.secho(result.strip('\r\n'),fg=color)
+        click.secho('All entries migrated!', fg="green")
+
+def list_source(ctx, offline, resource='time_entries'):
+    """
+    Returns the object to query a resource from, the local mirror
+    when working offline or the Harvest API otherwise
+    """
+    if not offline:
+        return api_source(ctx)
+    if 'fanout' in ctx.obj:
+        raise click.UsageError('--offline reads the local mirror of a single account')
+    store = ctx.obj['store']
+    if store.state(resource)['synced_at'] is None:
+        logger.warning('The local mirror is empty, run cropper sync first')
+    return store
+
+def use_checkpoints(ctx, checkpoint):
+    """
+    Makes the paged requests of the command resumable when asked to
+    """
+    if checkpoint:
+        from cropper.checkpoint import CheckpointStore
+        checkpoints = CheckpointStore(logger=logger)
+        for harvest in ctx.obj['harvests']:
+            harvest.checkpoints = checkpoints
+
+CHECKPOINT_HELP = "Save the results to disk as they arrive, so if the command is interrupted running it again resumes from the last page saved"
+
+def use_fields(ctx, fields, on_client=True):
+    """
+    Makes the paged requests of the command keep only the given
+    fields of every object, returns the projection if any. Without
+    on_client the caller applies the projection itself.
+    """
+    if not fields:
+        return None
+    from cropper.jsonlib import Projection
+    try:
+        projection = Projection(fields)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--fields')
+    if on_client:
+        for harvest in ctx.obj['harvests']:
+            harvest.projection = projection
+    return projection
+
+def entity_index(ctx):
+    """
+    Returns the index of projects, clients, users and task
+    assignments, shared by everything run in the same context
+    """
+    if 'index' not in ctx.obj:
+        from cropper.index import EntityIndex
+        ctx.obj['index'] = EntityIndex(ctx.obj['harvest'])
+    return ctx.obj['index']
+
+def projects_named(ctx, name):
+    """
+    Returns the projects with a name from the index, failing if
+    there is none
+    """
+    projects = entity_index(ctx).projects_named(name)
+    if not projects:
+        raise click.BadParameter(f'There is no project named {name}', param_hint='--project-name')
+    return projects
+
+SHARD_HELP = "Split the date range in windows of about this many entries, fetched in parallel with --concurrency, so entries changing meanwhile aren't duplicated or skipped"
+
+def shard_options(shard_size, offline):
+    """
+    Returns the keyword arguments to fetch time entries split in
+    date windows, if asked to
+    """
+    if not shard_size:
+        return {}
+    if offline:
+        raise click.UsageError('--shard-size only applies to the entries fetched from Harvest')
+    return {'shard_size': shard_size}
+
+FIELDS_HELP = "Comma separated fields to output, nested ones with dots like task.id, the rest are dropped as every page arrives"
+
+# The commands that run their query against every account given
+FANOUT_COMMANDS = {'clients', 'users', 'projects', 'tasks', 'time-entries', 'today', 'running'}
+
+LIST_FORMATS = click.Choice(['text', 'json', 'ndjson'])
+
+def print_json_list(entries):
+    """
+    Prints an iterable of objects as a JSON array, writing every
+    object as soon as it is available instead of building the
+    whole document in memory
+    """
+    from cropper import jsonlib
+    click.echo('[', nl=False)
+    separator = ''
+    for entry in timed(entries):
+        click.echo(separator + jsonlib.dumps(entry), nl=False)
+        separator = ','
+    click.echo(']')
 
-def print_list_objs(entries, headers, print_active=False, print_headers=True, template=None):
-    if print_headers:
-        click.secho(",".join(headers),fg="green")
-    for entry in entries:
-        print_obj(entry, headers, print_active, template)
+def print_ndjson(entries):
+    """
+    Prints an iterable of objects as JSON lines
+    """
+    from cropper import jsonlib
+    for entry in timed(entries):
+        click.echo(jsonlib.dumps(entry))
+
+def print_results(entries, format, headers, print_active=False, projection=None):
+    """
+    Prints the objects of a list command in the requested format,
+    as CSV with the given headers or the projected fields
+    """
+    if format == "text":
+        if projection:
+            print_active = print_active and 'is_active' in projection.fields
+            headers = projection.headers
+        ctx = click.get_current_context(silent=True)
+        if ctx and ctx.obj and 'fanout' in ctx.obj:
+            headers = ['account_id'] + headers
+        # The projection leaves out the fields an object doesn't have,
+        # like invoice.id of the entries not invoiced yet
+        print_list_objs(entries, headers, print_active, optional=projection is not None)
+    elif format == "ndjson":
+        print_ndjson(entries)
+    else:
+        print_json_list(entries)
 
 @click.group(context_settings=CONTEXT_SETTINGS)
 @click.option('-l', '--loglevel', type=click.Choice(['error', 'warn', 'info', 'debug']), default='warn')
-@click.option('-t', '--token', required=True, type=str, envvar='HARVEST_TOKEN',
+@click.option('-t', '--token', required=False, type=str, envvar='HARVEST_TOKEN',
               help="Your Harvest Auth Token, you can set this using the environment variable HARVEST_TOKEN")
-@click.option('-a', '--account-id', 'accountid', required=True, type=str, envvar='HARVEST_ID',
+@click.option('-a', '--account-id', 'accountid', required=False, type=str, envvar='HARVEST_ID',
               help="Your Harvest Account ID, you can set this using the environment variable HARVEST_ID")
+@click.option('--account', 'accounts', multiple=True, type=str, metavar='ACCOUNT_ID:TOKEN',
+              help="Query this account instead, repeat it to run the list commands against several accounts at once")
+@click.option('--accounts-file', 'accounts_file', required=False, type=click.Path(exists=True, dir_okay=False), envvar='HARVEST_ACCOUNTS_FILE',
+              help="INI file with a section per account holding its account_id and token, to query all of them at once")
 @click.option('-u', '--user-id', 'userid', required=False, type=int, envvar='HARVEST_USER_ID',
               help="Your Harvest User ID, you can set this using the environment variable HARVEST_USER_ID")
+@click.option('--concurrency', 'concurrency', default=1, type=click.IntRange(1, 16), envvar='HARVEST_CONCURRENCY',
+              help="Number of pages to fetch in parallel on paged endpoints, you can set this using the environment variable HARVEST_CONCURRENCY")
+@click.option('--no-cache', 'no_cache', is_flag=True, default=False,
+              help="Don't use the local cache of clients, users, projects and task assignments")
+@click.option('--api-url', 'api_url', required=False, type=str, envvar='HARVEST_API_URL',
+              help="Harvest API base url, to use a stand-in server, you can set this using the environment variable HARVEST_API_URL")
+@click.option('--rate-limit', 'rate_limit', required=False, type=click.IntRange(1), envvar='HARVEST_RATE_LIMIT',
+              help="Requests allowed every 15 seconds, 100 by default as Harvest does")
+@click.option('--connect-timeout', 'connect_timeout', default=10, type=click.FloatRange(0.1), envvar='HARVEST_CONNECT_TIMEOUT',
+              help="Seconds to wait for a connection to Harvest before retrying")
+@click.option('--read-timeout', 'read_timeout', default=60, type=click.FloatRange(0.1), envvar='HARVEST_READ_TIMEOUT',
+              help="Seconds to wait for a stalled response before retrying")
+@click.option('--pool-size', 'pool_size', required=False, type=click.IntRange(1), envvar='HARVEST_POOL_SIZE',
+              help="Connections to keep open, 10 or the concurrency if greater by default, and at least one per worker of bulk updates")
+@click.option('--record', 'record', required=False, type=click.Path(file_okay=False),
+              help="Save every API response in this folder to replay them later")
+@click.option('--replay', 'replay', required=False, type=click.Path(exists=True, file_okay=False),
+              help="Answer from the responses saved with --record instead of calling Harvest")
+@click.option('--stats', 'stats', is_flag=True, default=False,
+              help="Print a summary of the API requests and where the time went to stderr")
+@click.option('--stats-file', 'stats_file', required=False, type=click.Path(dir_okay=False), envvar='HARVEST_STATS_FILE',
+              help="Write the summary of the API requests to this file, in the Prometheus text format if it ends with .prom or as JSON otherwise")
+@click.option('--profile', 'profile', required=False, type=click.Path(dir_okay=False), envvar='HARVEST_PROFILE',
+              help="Profile the CPU time and memory of the command and write the results to this file as JSON, and the whole CPU profile next to it with a .pstats extension")
 @click.version_option(VERSION, '--version', '-v')
 @click.pass_context
-def cli(ctx, loglevel, token, accountid, userid):
+def cli(ctx, loglevel, token, accountid, accounts, accounts_file, userid, concurrency, no_cache, api_url, rate_limit,
+        connect_timeout, read_timeout, pool_size, record, replay, stats, stats_file, profile):
     """
     This command line tool helps you explore your Harvest account and
     modify time entries. Find more details on each command help instructions.
     """
+    logging.basicConfig(
+        level=logging.WARNING,
+        format=' %(asctime)s [%(levelname)-7s] %(message)s',
+        datefmt='%I:%M:%S %p')
+
     if loglevel == 'error':
         logger.setLevel(logging.ERROR)
     elif loglevel == 'warn':
@@ -105,20 +284,116 @@ def cli(ctx, loglevel, token, accountid, userid):
         # by means other than the `if` block below
         ctx.ensure_object(dict)
 
-        ctx.obj['harvest'] = Harvest(
-            logger=logger, token=token, accountid=accountid)
+        if profile:
+            # Started first to include the imports of the command
+            from cropper.profiling import Profiler
+            profiler = Profiler().start()
+            command = ctx.invoked_subcommand
+
+            def write_profile():
+                profiler.stop()
+                profiler.dump(profile, command)
+                logger.info(f'Profile written to {profile} and {profile}.pstats')
+            ctx.call_on_close(write_profile)
+
+        from cropper.harvest import Harvest
+        from cropper.cache import ResponseCache
+        from cropper.store import LocalStore
+        from cropper import transport as transports
+        from cropper.exceptions import HarvestConnectionError
+        from cropper.accounts import Account, FanOut, load_accounts, parse_account
+
+        if record and replay:
+            raise click.UsageError('--record and --replay can not be used together')
+        try:
+            account_list = [parse_account(account) for account in accounts]
+            if accounts_file:
+                account_list += load_accounts(accounts_file)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        if not account_list:
+            if not token:
+                raise click.UsageError('Missing option "-t" / "--token", or --account or --accounts-file')
+            if not accountid:
+                raise click.UsageError('Missing option "-a" / "--account-id", or --account or --accounts-file')
+            account_list = [Account(accountid, accountid, token)]
+        fan_out = len(account_list) > 1
+        if fan_out and ctx.invoked_subcommand not in FANOUT_COMMANDS:
+            raise click.UsageError(f'{ctx.invoked_subcommand} works on a single account, '
+                                   f'only {", ".join(sorted(FANOUT_COMMANDS))} query several at once')
+
+        def account_folder(folder, account):
+            # Several accounts make the same requests, keep their responses apart
+            return os.path.join(folder, str(account.account_id)) if fan_out else folder
+
+        # Every response has to reach the transport to be recorded or replayed
+        use_cache = not (no_cache or record or replay)
+        ctx.obj['cache'] = ResponseCache()
+        harvests = ctx.obj['harvests'] = []
+        for account in account_list:
+            # Each account gets its own connections and rate limiter
+            if replay:
+                try:
+                    transport = transports.ReplayTransport(account_folder(replay, account))
+                except HarvestConnectionError as e:
+                    raise click.BadParameter(f'account {account.account_id}: {e}', param_hint='--replay')
+            else:
+                transport = transports.HTTPTransport(
+                    pool_size=pool_size or max(10, concurrency),
+                    connect_timeout=connect_timeout, read_timeout=read_timeout)
+                if record:
+                    transport = transports.RecordingTransport(transport, account_folder(record, account))
+            harvests.append(Harvest(
+                logger=logger, token=account.token, accountid=account.account_id, concurrency=concurrency,
+                cache=ctx.obj['cache'] if use_cache else None, api_url=api_url, rate_limit=rate_limit,
+                transport=transport))
+        ctx.obj['harvest'] = harvests[0]
+        ctx.obj['store'] = LocalStore(account_list[0].account_id)
         ctx.obj['user_id'] = userid
+
+        if stats or stats_file:
+            from cropper.stats import StatsCollector
+            collector = ctx.obj['stats'] = StatsCollector()
+            for harvest in harvests:
+                harvest.hooks.append(collector)
+            command = ctx.invoked_subcommand
+
+            def report():
+                if stats:
+                    collector.print_summary()
+                if stats_file:
+                    collector.dump(stats_file, command)
+            ctx.call_on_close(report)
+
+        if fan_out:
+            fanout = ctx.obj['fanout'] = FanOut(harvests)
+
+            # Registered last, so it runs after the other reports
+            # when it exits with an error
+            def report_accounts():
+                if not fanout.timings:
+                    return
+                click.echo(fanout.format_timings(), err=True)
+                failed = fanout.failed
+                for timing in failed:
+                    click.secho(f'Account {timing.account_id} failed: {timing.error}', fg='red', err=True)
+                if failed:
+                    # The results printed are only partial
+                    ctx.obj['failed'] = True
+                    ctx.exit(1)
+            ctx.call_on_close(report_accounts)
     
 
 
 @cli.command(help="Checks connectivity with Harvest and shows user info")
 @click.pass_context
 def check(ctx):
+    from cropper import jsonlib
     hobj = ctx.obj['harvest']
     try:
         check = hobj.check()
         logger.info('Harvest auth worked!!\r\n')
-        click.echo(json.dumps(check))
+        click.echo(jsonlib.dumps(check))
     except Exception as e:
         click.secho(str(e), fg='red')
         ctx.abort()
@@ -127,131 +402,190 @@ def check(ctx):
 @cli.command(help="Get company data")
 @click.pass_context
 def company(ctx):
+    from cropper import jsonlib
     hobj = ctx.obj['harvest']
     try:
         data = hobj.company()
-        click.echo(json.dumps(data))
+        click.echo(jsonlib.dumps(data))
     except Exception as e:
-        click.secho(str(e), fg='red')
-        ctx.abort
+        show_error(ctx, e)
 
 
 @cli.command(help="Get clients data")
-@click.option('-f', '--format', 'format', default='text', type=click.Choice(['text', 'json']), help="Output format")
+@click.option('-f', '--format', 'format', default='text', type=LIST_FORMATS, help="Output format")
 @click.option('-a', '--active', 'active', type=click.Choice(['all', 'active', 'inactive']), default='all', help="Filter by status")
+@click.option('--offline', 'offline', is_flag=True, default=False, help="Read the clients from the local mirror")
+@click.option('--fields', 'fields', required=False, type=str, help=FIELDS_HELP)
+@click.option('--checkpoint', 'checkpoint', is_flag=True, default=False, help=CHECKPOINT_HELP)
 @click.pass_context
-def clients(ctx, format, active):
-    hobj = ctx.obj['harvest']
+def clients(ctx, format, active, offline, fields, checkpoint):
+    hobj = list_source(ctx, offline, 'clients')
+    use_checkpoints(ctx, checkpoint)
+    projection = use_fields(ctx, fields)
     try:
-        data = hobj.clients(active)
-        if format == "text":
-            headers = ['id','name','is_active']
-            print_list_objs(data, headers, True)
-        else:
-            click.echo(json.dumps(data))
+        data = hobj.iter_clients(active)
+        if offline and projection:
+            data = map(projection, data)
+        headers = ['id','name','is_active']
+        print_results(data, format, headers, True, projection)
     except Exception as e:
-        click.secho(str(e), fg='red')
-        ctx.abort
+        show_error(ctx, e)
 
 @cli.command(help="Get users data")
-@click.option('-f', '--format', 'format', default='text', type=click.Choice(['text', 'json']), help="Output format")
+@click.option('-f', '--format', 'format', default='text', type=LIST_FORMATS, help="Output format")
 @click.option('-a', '--active', 'active', type=click.Choice(['all', 'active', 'inactive']), default='all', help="Filter by status")
+@click.option('--offline', 'offline', is_flag=True, default=False, help="Read the users from the local mirror")
+@click.option('--fields', 'fields', required=False, type=str, help=FIELDS_HELP)
+@click.option('--checkpoint', 'checkpoint', is_flag=True, default=False, help=CHECKPOINT_HELP)
 @click.pass_context
-def users(ctx, format, active):
-    hobj = ctx.obj['harvest']
+def users(ctx, format, active, offline, fields, checkpoint):
+    hobj = list_source(ctx, offline, 'users')
+    use_checkpoints(ctx, checkpoint)
+    projection = use_fields(ctx, fields)
     try:
-        data = hobj.users(active)
-        if format == "text":
-            headers = ['id','first_name','last_name','is_admin']
-            print_list_objs(data, headers, True)
-        else:
-            click.echo(json.dumps(data))
+        data = hobj.iter_users(active)
+        if offline and projection:
+            data = map(projection, data)
+        headers = ['id','first_name','last_name','is_admin']
+        print_results(data, format, headers, True, projection)
     except Exception as e:
-        click.secho(str(e), fg='red')
-        ctx.abort
+        show_error(ctx, e)
 
 
 @cli.command(help="Get the list of projects")
-@click.option('-f', '--format', 'format', default='text', type=click.Choice(['text', 'json']), help="Output format")
+@click.option('-f', '--format', 'format', default='text', type=LIST_FORMATS, help="Output format")
 @click.option('-a', '--active', 'active', type=click.Choice(['all', 'active', 'inactive']), default='all', help="Filter by status")
 @click.option('-c', '--client', 'client', default=None, type=str, help="Filter by client identifier")
+@click.option('--offline', 'offline', is_flag=True, default=False, help="Read the projects from the local mirror")
+@click.option('--fields', 'fields', required=False, type=str, help=FIELDS_HELP)
+@click.option('--checkpoint', 'checkpoint', is_flag=True, default=False, help=CHECKPOINT_HELP)
 @click.pass_context
-def projects(ctx, format, active, client):
-    hobj = ctx.obj['harvest']
+def projects(ctx, format, active, client, offline, fields, checkpoint):
+    hobj = list_source(ctx, offline, 'projects')
+    use_checkpoints(ctx, checkpoint)
+    projection = use_fields(ctx, fields)
     try:
-        data = hobj.projects(active, client)
-        if format == "text":
-            headers = ['id','name','client__name','is_active']
-            print_list_objs(data, headers, True)
-        else:
-            click.echo(json.dumps(data))
+        data = hobj.iter_projects(active, client)
+        if offline and projection:
+            data = map(projection, data)
+        headers = ['id','name','client__name','is_active']
+        print_results(data, format, headers, True, projection)
     except Exception as e:
-        click.secho(str(e), fg='red')
-        ctx.abort
+        show_error(ctx, e)
 
 
-@cli.command(help="Get a project")
+@cli.command(help="Get one or more projects")
 @click.option('-f', '--format', 'format', default='json', type=click.Choice(['text', 'json']), help="Output format")
-@click.argument('project_id', type=int)
+@click.option('-n', '--project-name', 'project_name', required=False, type=str, help="Get the projects with this name instead")
+@click.argument('project_ids', type=int, nargs=-1)
 @click.pass_context
-def project(ctx, format, project_id):
+def project(ctx, format, project_name, project_ids):
+    from cropper import jsonlib
+    if not project_ids and not project_name:
+        raise click.UsageError('Give at least a project identifier or --project-name')
     hobj = ctx.obj['harvest']
+    # The old single project form prints an object, the rest a list
+    single = len(project_ids) == 1 and not project_name
     try:
-        data = hobj.project(project_id)
+        if single:
+            data = [hobj.project(project_ids[0])]
+        else:
+            # Load all the projects once instead of one request each
+            index = entity_index(ctx)
+            data = [index.project(project_id) for project_id in project_ids]
+            missing = [str(project_id) for project_id, found in zip(project_ids, data) if found is None]
+            if missing:
+                raise ValueError(f'There are no projects with the identifiers {", ".join(missing)}')
+            if project_name:
+                data += projects_named(ctx, project_name)
         if format == "text":
             headers = ['id','name', 'code', 'client__name','is_active', 'is_billable' ,'created_at','updated_at','notes']
-            print_list_objs([data], headers, True)
+            print_list_objs(data, headers, True)
+        elif single:
+            click.echo(jsonlib.dumps(data[0]))
         else:
-            click.echo(json.dumps(data))
+            click.echo(jsonlib.dumps(data))
+    except click.ClickException:
+        raise
     except Exception as e:
-        click.secho(str(e), fg='red')
-        ctx.abort
+        show_error(ctx, e)
 
 
-@cli.command(name="tasks", help="Tasks assignments")
-@click.option('-f', '--format', 'format', default='text', type=click.Choice(['text', 'json']), help="Output format")
-@click.argument('project_id', type=int)
+@cli.command(name="tasks", help="Tasks assignments of a project, the projects with a name or all of them")
+@click.option('-f', '--format', 'format', default='text', type=LIST_FORMATS, help="Output format")
+@click.option('--all', 'all_projects', is_flag=True, default=False, help="The task assignments of every project")
+@click.option('-n', '--project-name', 'project_name', required=False, type=str, help="The task assignments of the projects with this name")
+@click.argument('project_id', type=int, required=False)
+@click.option('--fields', 'fields', required=False, type=str, help=FIELDS_HELP)
+@click.option('--checkpoint', 'checkpoint', is_flag=True, default=False, help=CHECKPOINT_HELP)
 @click.pass_context
-def task_assignments(ctx, format, project_id):
-    hobj = ctx.obj['harvest']
+def task_assignments(ctx, format, all_projects, project_name, project_id, fields, checkpoint):
+    if [bool(project_id), all_projects, bool(project_name)].count(True) != 1:
+        raise click.UsageError('Give either a project identifier, --project-name or --all')
+    hobj = api_source(ctx)
+    headers = ['id','project__name','task__id','task__name','is_active']
     try:
-        data = hobj.task_assignments(project_id)
-        if format == "text":
-            headers = ['id','name','is_active']
-            print_list_objs(data, headers, True)
+        if project_name:
+            if 'fanout' in ctx.obj:
+                raise click.UsageError('--project-name looks up the projects of a single account')
+            # Grouped by project from a single account wide listing
+            index = entity_index(ctx)
+            data = [assignment for found in projects_named(ctx, project_name)
+                    for assignment in index.task_assignments(found['id'])]
+            projection = use_fields(ctx, fields, on_client=False)
+            if projection:
+                data = map(projection, data)
         else:
-            click.echo(json.dumps(data))
+            use_checkpoints(ctx, checkpoint)
+            projection = use_fields(ctx, fields)
+            data = hobj.iter_task_assignments(None if all_projects else project_id)
+        print_results(data, format, headers, True, projection)
+    except click.ClickException:
+        raise
     except Exception as e:
-        click.secho(str(e), fg='red')
-        ctx.abort
+        show_error(ctx, e)
 
 
 @cli.command(name="time-entries", help="Get time entries for a given project")
-@click.option('-f', '--format', 'format', default='text', required=False, type=click.Choice(['text', 'json']), help="Output format")
+@click.option('-f', '--format', 'format', default='text', required=False, type=LIST_FORMATS, help="Output format")
 @click.option('-ti', '--task-id', 'task_id', required=False, type=int, help="Filter by task")
 @click.option('-ui', '--user-id', 'user_id', required=False, type=int, help="Filter by user")
+@click.option('-ci', '--client-id', 'client_id', required=False, type=int, help="Filter by client")
+@click.option('--from', '_from', required=False, type=DATE, help="Only entries spent on or after this date (YYYY-MM-DD)")
+@click.option('--to', 'to', required=False, type=DATE, help="Only entries spent on or before this date (YYYY-MM-DD)")
+@click.option('--is-billed', 'is_billed', required=False, type=click.Choice(['true', 'false']), help="Filter by billed status")
+@click.option('--updated-since', 'updated_since', required=False, type=str, help="Only entries updated since this ISO 8601 date time")
+@click.option('--offline', 'offline', is_flag=True, default=False, help="Read the entries from the local mirror")
 @click.argument('project_id',type=int)
+@click.option('--fields', 'fields', required=False, type=str, help=FIELDS_HELP)
+@click.option('--checkpoint', 'checkpoint', is_flag=True, default=False, help=CHECKPOINT_HELP)
+@click.option('--shard-size', 'shard_size', required=False, type=click.IntRange(100), help=SHARD_HELP)
 @click.pass_context
-def time_entries(ctx, format, project_id, task_id, user_id):
-    hobj = ctx.obj['harvest']
+def time_entries(ctx, format, project_id, task_id, user_id, client_id, _from, to, is_billed, updated_since, offline, fields, checkpoint, shard_size):
+    if checkpoint and shard_size:
+        raise click.UsageError('--checkpoint and --shard-size can not be used together')
+    hobj = list_source(ctx, offline)
+    sharding = shard_options(shard_size, offline)
+    use_checkpoints(ctx, checkpoint)
+    projection = use_fields(ctx, fields)
     try:
-        data = hobj.time_entries(project_id = project_id, user_id = user_id)
-        if task_id:
-            data = list(filter(lambda entry: entry['task']['id'] == task_id, data))
-        if format == "text":
-            headers = ['id','user__name','task__id','task__name', 'spent_date', 'hours','notes']
-            print_list_objs(data, headers, False)
-        else:
-            click.echo(json.dumps(data))
+        data = hobj.iter_time_entries(
+            project_id = project_id, task_id = task_id, user_id = user_id, client_id = client_id,
+            _from = iso_date(_from), to = iso_date(to), is_billed = is_billed, updated_since = updated_since,
+            **sharding)
+        if offline and projection:
+            data = map(projection, data)
+        headers = ['id','user__name','task__id','task__name', 'spent_date', 'hours','notes']
+        print_results(data, format, headers, False, projection)
     except Exception as e:
-        click.secho(str(e), fg='red')
-        ctx.abort
+        show_error(ctx, e)
 
 @cli.command(name="time-entry", help="Get a time entries")
 @click.option('-f', '--format', 'format', default='text', type=click.Choice(['text', 'json']), help="Output format")
 @click.argument('time_entry_id', type=int)
 @click.pass_context
 def time_entry(ctx, format, time_entry_id):
+    from cropper import jsonlib
     hobj = ctx.obj['harvest']
     try:
         entry = hobj.time_entry(time_entry_id)
@@ -259,10 +593,9 @@ def time_entry(ctx, format, time_entry_id):
             headers = ['id','user__name','task__id','task__name', 'spent_date', 'hours','notes']
             print_list_objs([entry], headers, False)
         else:
-            click.echo(json.dumps(entry))
+            click.echo(jsonlib.dumps(entry))
     except Exception as e:
-        click.secho(str(e), fg='red')
-        ctx.abort
+        show_error(ctx, e)
 
 
 @cli.command(name="update-time-entry", help="Update a time entry with a new project and task identifiers")
@@ -271,14 +604,14 @@ def time_entry(ctx, format, time_entry_id):
 @click.argument('task_id', type=int)
 @click.pass_context
 def update_time_entry(ctx, time_entry_id, project_id, task_id):
+    from cropper import jsonlib
     hobj = ctx.obj['harvest']
     try:
         data = hobj.update_time_entry(
             time_entry_id, project_id, task_id)
-        click.echo(json.dumps(data))
+        click.echo(jsonlib.dumps(data))
     except Exception as e:
-        click.secho(str(e), fg='red')
-        ctx.abort
+        show_error(ctx, e)
 
 
 @cli.command(name="update-all-time-entries", help="Update all time entries from a given project and task to another project and task")
@@ -287,59 +620,271 @@ def update_time_entry(ctx, time_entry_id, project_id, task_id):
 @click.option('-tp', '--to-project', 'to_project', required=True, type=int, help="Destination project")
 @click.option('-tt', '--to-task', 'to_task', required=True, type=int, help="Destination task")
 @click.option('-na', '--note-append', 'note_append', required=False, type=str, help="Text to add to the time entry note")
+@click.option('--from', '_from', required=False, type=DATE, help="Only entries spent on or after this date (YYYY-MM-DD)")
+@click.option('--to', 'to', required=False, type=DATE, help="Only entries spent on or before this date (YYYY-MM-DD)")
+@click.option('-w', '--workers', 'workers', default=4, type=click.IntRange(1, 16), help="Number of updates to run in parallel")
+@click.option('--dry-run', 'dry_run', is_flag=True, default=False, help="Only print how many updates would be sent and the estimated time")
 @click.pass_context
-def update_all_time_entries(ctx, from_project, from_task, to_project, to_task, note_append):
+def update_all_time_entries(ctx, from_project, from_task, to_project, to_task, note_append, _from, to, workers, dry_run):
+    from cropper.bulk import BulkUpdater, TimeEntryUpdate
+    from cropper.records import TimeEntryTable
     hobj = ctx.obj['harvest']
     try:
-        # Get all the time entries
-        data = hobj.time_entries(project_id = from_project)
-        data = filter(lambda entry: entry['task']['id'] == from_task, data)
+        # Get all the time entries before updating any of them so
+        # the pages don't shift under our feet, keeping just the
+        # fields needed to update them
+        data = TimeEntryTable().compact_all(hobj.iter_time_entries(
+            project_id = from_project, task_id = from_task, _from = iso_date(_from), to = iso_date(to)))
+        updates = []
         for entry in data:
-            tid = entry['id']
+            notes = None
             if note_append:
                 if entry['notes']:
                     notes = '{} - {}'.format(entry['notes'], note_append)
                 else:
                     notes = note_append
-                result = hobj.update_time_entry( tid, to_project, to_task, notes)
-            else:
-                result = hobj.update_time_entry( tid, to_project, to_task)
+            updates.append(TimeEntryUpdate(entry['id'], to_project, to_task, notes))
+
+        pool_for_workers(ctx, workers)
+        updater = BulkUpdater(hobj, concurrency=workers, on_result=print_update(lambda update: 'updated'))
+        estimate = updater.estimate(len(updates))
+        if dry_run:
+            click.echo(f'{len(updates)} time entries would be updated, estimated time {estimate:.0f}s')
+            return
+
+        logger.info(f'Updating {len(updates)} time entries, estimated time {estimate:.0f}s')
+        result = updater.run(updates)
+        print_bulk_result(result)
+    except Exception as e:
+        show_error(ctx, e)
+        return
 
-            if result:
-                click.secho(f'Time entry {tid} updated', fg="green")
+    if result.failed:
+        ctx.exit(1)
+
+@cli.command(name="migrate", help="Move the time entries of many project and task pairs to others, as listed in a mapping file")
+@click.option('-m', '--mapping', 'mapping', required=True, type=click.Path(exists=True, dir_okay=False),
+              help="CSV file with the from_project, from_task, to_project and to_task columns, and optionally note_append")
+@click.option('-j', '--journal', 'journal', required=False, type=click.Path(dir_okay=False),
+              help="File keeping the migrated entries to resume an interrupted run, the mapping file plus .journal by default")
+@click.option('--from', '_from', required=False, type=DATE, help="Only entries spent on or after this date (YYYY-MM-DD)")
+@click.option('--to', 'to', required=False, type=DATE, help="Only entries spent on or before this date (YYYY-MM-DD)")
+@click.option('-w', '--workers', 'workers', default=4, type=click.IntRange(1, 16), help="Number of updates to run in parallel")
+@click.option('--dry-run', 'dry_run', is_flag=True, default=False, help="Only print how many updates would be sent and the estimated time")
+@click.pass_context
+def migrate(ctx, mapping, journal, _from, to, workers, dry_run):
+    from cropper.bulk import BulkUpdater
+    from cropper.migrate import Journal, Migration, load_mapping
+    hobj = ctx.obj['harvest']
+    try:
+        rules = load_mapping(mapping)
+        migration = Migration(hobj, rules, Journal(journal or mapping + '.journal'), logger)
+        updates = migration.updates(_from=iso_date(_from), to=iso_date(to))
+        counts = migration.counts
+        click.echo(f"{counts['fetched']} time entries fetched, {counts['matched']} match the mapping, "
+                   f"{counts['in_journal']} already migrated, {counts['at_target']} already at their target", err=True)
+
+        estimate = BulkUpdater(hobj, concurrency=workers).estimate(len(updates))
+        if dry_run:
+            click.echo(f'{len(updates)} time entries would be updated, estimated time {estimate:.0f}s')
+            return
+
+        logger.info(f'Updating {len(updates)} time entries, estimated time {estimate:.0f}s')
+        pool_for_workers(ctx, workers)
+        result = migration.run(updates, workers, print_update(
+            lambda update: f'moved to project {update.project_id} task {update.task_id}'))
+        print_bulk_result(result, 'Run the same command again to retry the failed entries')
+    except Exception as e:
+        show_error(ctx, e)
+        return
+
+    if result.failed:
+        ctx.exit(1)
+
+@cli.command(name="report", help="Sum the hours of the time entries by user, client, project, task and period")
+@click.option('-f', '--format', 'format', default='text', type=click.Choice(['text', 'json']), help="Output format")
+@click.option('-b', '--by', 'group_by', multiple=True, required=True, type=click.Choice(list(GROUPS)),
+              help="Group by this key, can be repeated")
+@click.option('--from', '_from', required=True, type=DATE, help="Only entries spent on or after this date (YYYY-MM-DD)")
+@click.option('--to', 'to', required=True, type=DATE, help="Only entries spent on or before this date (YYYY-MM-DD)")
+@click.option('-pi', '--project-id', 'project_id', required=False, type=int, help="Filter by project")
+@click.option('-ci', '--client-id', 'client_id', required=False, type=int, help="Filter by client")
+@click.option('-ui', '--user-id', 'user_id', required=False, type=int, help="Filter by user")
+@click.option('--engine', 'engine', default='python', type=click.Choice(['python', 'numpy']),
+              help="Sum the entries one by one or in NumPy chunks")
+@click.option('--offline', 'offline', is_flag=True, default=False, help="Read the entries from the local mirror")
+@click.option('--shard-size', 'shard_size', required=False, type=click.IntRange(100), help=SHARD_HELP)
+@click.pass_context
+def report(ctx, format, group_by, _from, to, project_id, client_id, user_id, engine, offline, shard_size):
+    from cropper import jsonlib
+    from cropper.report import COLUMNS, Report, NumpyReport
+    hobj = list_source(ctx, offline)
+    sharding = shard_options(shard_size, offline)
+    try:
+        data = hobj.iter_time_entries(
+            project_id = project_id, client_id = client_id, user_id = user_id,
+            _from = iso_date(_from), to = iso_date(to), **sharding)
+        aggregator = NumpyReport(group_by) if engine == 'numpy' else Report(group_by)
+        aggregator.add_all(data)
+        rows = aggregator.rows()
+        total = aggregator.total()
+        if format == "text":
+            print_list_objs(rows, list(group_by) + COLUMNS, False)
+            click.secho(f'Total: {total["hours"]:.2f} hours, {total["billable_hours"]:.2f} billable, {total["entries"]} entries', fg="red")
         else:
-            click.secho('All entries migrated!', fg="green")
+            click.echo(jsonlib.dumps({'groups': rows, 'total': total}))
     except Exception as e:
-        click.secho(str(e), fg='red')
-        ctx.abort
+        show_error(ctx, e)
+
+
+@cli.command(name="export", help="Write the time entries, projects, users or clients to a CSV, Parquet or Arrow file, in chunks as they arrive")
+@click.argument('resource', type=click.Choice(['time-entries', 'projects', 'users', 'clients']))
+@click.argument('output', type=click.Path(dir_okay=False))
+@click.option('-f', '--format', 'format', required=False, type=click.Choice(['csv', 'parquet', 'arrow']),
+              help="Output format, by default from the file extension or CSV otherwise, gzip compressed when the file ends with .gz")
+@click.option('--fields', 'fields', required=False, type=str, help="Comma separated fields to export, nested ones with dots like task.id")
+@click.option('--chunk-size', 'chunk_size', default=10000, type=click.IntRange(1), show_default=True,
+              help="Rows kept in memory and written at once, every chunk is a row group in Parquet")
+@click.option('-a', '--active', 'active', type=click.Choice(['all', 'active', 'inactive']), default='all', help="Filter projects, users and clients by status")
+@click.option('--from', '_from', required=False, type=DATE, help="Only entries spent on or after this date (YYYY-MM-DD)")
+@click.option('--to', 'to', required=False, type=DATE, help="Only entries spent on or before this date (YYYY-MM-DD)")
+@click.option('-pi', '--project-id', 'project_id', required=False, type=int, help="Filter entries by project")
+@click.option('-ci', '--client-id', 'client_id', required=False, type=int, help="Filter entries and projects by client")
+@click.option('-ui', '--user-id', 'user_id', required=False, type=int, help="Filter entries by user")
+@click.option('--updated-since', 'updated_since', required=False, type=str, help="Only records updated since this ISO 8601 date time")
+@click.option('--shard-size', 'shard_size', required=False, type=click.IntRange(100), help=SHARD_HELP)
+@click.pass_context
+def export(ctx, resource, output, format, fields, chunk_size, active, _from, to, project_id, client_id, user_id, updated_since, shard_size):
+    import time
+    from cropper.export import EXPORT_FIELDS, ArrowWriter, ChunkedExport, CSVWriter
+    hobj = ctx.obj['harvest']
+    if not format:
+        extension = os.path.splitext(output)[1].lower()
+        format = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}.get(extension, 'csv')
+    try:
+        if fields:
+            # Only the exported fields are kept as every page arrives
+            headers = use_fields(ctx, fields).headers
+        else:
+            headers = EXPORT_FIELDS[resource.replace('-', '_')]
+            use_fields(ctx, [header.replace('__', '.') for header in headers])
+
+        if resource == 'time-entries':
+            data = hobj.iter_time_entries(
+                project_id = project_id, client_id = client_id, user_id = user_id,
+                _from = iso_date(_from), to = iso_date(to), updated_since = updated_since,
+                **shard_options(shard_size, False))
+        elif resource == 'projects':
+            data = hobj.iter_projects(active, client_id, updated_since)
+        elif resource == 'users':
+            data = hobj.iter_users(active, updated_since)
+        else:
+            data = hobj.iter_clients(active, updated_since)
+
+        # Written aside and moved in place once complete
+        partial = output + '.partial'
+        if format == 'csv':
+            writer = CSVWriter(partial, compress=output.lower().endswith('.gz'), name=output)
+        else:
+            writer = ArrowWriter(partial, parquet=format == 'parquet')
+        started = time.perf_counter()
+        try:
+            rows = ChunkedExport(writer, headers, chunk_size).write_all(timed(data))
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        os.replace(partial, output)
+        click.secho(f'{rows} {resource} written to {output} in {time.perf_counter() - started:.1f}s', fg="green", err=True)
+    except click.ClickException:
+        raise
+    except Exception as e:
+        show_error(ctx, e)
+
+
+@cli.command(name="sync", help="Update the local mirror of time entries, projects, users and clients")
+@click.option('-r', '--resource', 'resources', multiple=True, type=click.Choice(['clients', 'users', 'projects', 'time_entries']),
+              help="Sync only these resources")
+@click.option('--reconcile', 'reconcile', is_flag=True, default=False, help="Fetch everything again to drop deleted records")
+@click.option('--reconcile-every', 'reconcile_every', default=7, type=int, show_default=True,
+              help="Days between automatic reconciliation passes")
+@click.pass_context
+def sync(ctx, resources, reconcile, reconcile_every):
+    from cropper.store import Synchronizer
+    hobj = ctx.obj['harvest']
+    store = ctx.obj['store']
+    try:
+        synchronizer = Synchronizer(hobj, store, logger)
+        summary = synchronizer.sync(
+            resources or ctx.obj['store'].RESOURCES, reconcile, reconcile_every)
+        for resource, counts in summary.items():
+            click.secho(f'{resource:<15s} {counts["stored"]:>8d} stored {counts["deleted"]:>8d} deleted', fg="green")
+    except Exception as e:
+        show_error(ctx, e)
+
+
+@cli.group(name="cache", help="Manage the local cache of API responses")
+def cache():
+    pass
+
+
+@cache.command(name="clear", help="Remove all the cached responses and the results saved by interrupted exports")
+@click.pass_context
+def cache_clear(ctx):
+    from cropper.checkpoint import CheckpointStore
+    removed = ctx.obj['cache'].clear()
+    click.secho(f'{removed} cached responses removed', fg="green")
+    removed = CheckpointStore().clear()
+    click.secho(f'{removed} interrupted exports removed', fg="green")
+
+
+@cache.command(name="stats", help="Show the cached responses by endpoint")
+@click.option('-f', '--format', 'format', default='text', type=click.Choice(['text', 'json']), help="Output format")
+@click.pass_context
+def cache_stats(ctx, format):
+    from cropper import jsonlib
+    data = ctx.obj['cache'].stats()
+    if format == "text":
+        headers = ['endpoint', 'responses', 'hits', 'bytes', 'oldest']
+        print_list_objs(data, headers, False)
+    else:
+        click.echo(jsonlib.dumps(data))
 
 @cli.command(name="running", help="Running time entries")
 @click.option('-f', '--format', 'format', default='text', type=click.Choice(['text', 'json']), help="Output format")
 @click.option('--mine/--all', 'mine', default=True, help="All the entries or just mine")
+@click.option('--offline', 'offline', is_flag=True, default=False, help="Read the entries from the local mirror")
 @click.pass_context
-def runnnig(ctx, format, mine):
-    hobj = ctx.obj['harvest']
+def runnnig(ctx, format, mine, offline):
+    import sys, traceback
+    from cropper.records import TimeEntryTable
+    hobj = list_source(ctx, offline)
     try:
         user_id = ctx.obj['user_id'] if mine else None
-        data = hobj.time_entries(is_running = "true", user_id = user_id)
+        data = hobj.iter_time_entries(is_running = "true", user_id = user_id)
 
         if format == "text":
+            data = TimeEntryTable().compact_all(data)
             data_by_user = {}
             for d in data:
-                user_name = d['user']['name'] 
-                if user_name in data_by_user:
-                    data_by_user[user_name].append(d)
+                # The account is only set when querying several
+                user = (d['account_id'], d['user']['name'])
+                if user in data_by_user:
+                    data_by_user[user].append(d)
                 else:
-                    data_by_user[user_name] = [d]
+                    data_by_user[user] = [d]
             
             headers = ['hours', 'task__name','notes']
             base_template = "{hours:<4.2f} | {task__name:<30s} | {notes}"
             for user in data_by_user:
+                account_id, user_name = user
                 if mine:
                     template = base_template
                 else:
-                    user_first = user.split(' ')[0]
+                    user_first = user_name.split(' ')[0]
                     template = "".join([f'{user_first:<10s}| ', base_template ])
+                if account_id is not None:
+                    template = f'{account_id!s:<10}| ' + template
                 print_list_objs(
                     data_by_user[user], 
                     headers,
@@ -349,43 +894,72 @@ def runnnig(ctx, format, mine):
     
 
         else:
-            click.echo(json.dumps(data))
+            print_json_list(data)
     except Exception as e:
-        click.secho(str(e), fg='red')
+        show_error(ctx, e)
 
         exc_traceback = sys.exc_info()[2]
         click.echo("*** print_tb:")
         traceback.print_tb(exc_traceback, limit=1, file=sys.stdout)
         ctx.abort
 
+@cli.command(name="watch", help="Keep polling the running timers and print their changes as JSON lines")
+@click.option('-i', '--interval', 'interval', default=60, type=click.FloatRange(5), show_default=True, help="Seconds between polls")
+@click.option('--mine/--all', 'mine', default=True, help="All the timers or just mine")
+@click.option('--hook', 'hook', required=False, type=str,
+              help="Shell command to run on every event, it gets the event JSON on stdin and its name in CROPPER_EVENT")
+@click.pass_context
+def watch(ctx, interval, mine, hook):
+    from cropper import jsonlib
+    from cropper.watch import TimerWatcher, run_hook
+    hobj = ctx.obj['harvest']
+    user_id = ctx.obj['user_id'] if mine else None
+
+    def emit(event):
+        click.echo(jsonlib.dumps(event))
+        if hook:
+            run_hook(hook, event, logger)
+
+    try:
+        TimerWatcher(hobj, user_id).watch(interval, emit, logger)
+    except KeyboardInterrupt:
+        pass
+
 @cli.command(name="today", help="Today time entries")
 @click.option('-f', '--format', 'format', default='text', type=click.Choice(['text', 'json']), help="Output format")
 @click.option('--mine/--all', 'mine', default=True, help="All the entries or just mine")
+@click.option('--offline', 'offline', is_flag=True, default=False, help="Read the entries from the local mirror")
 @click.pass_context
-def today(ctx, format, mine):
-    hobj = ctx.obj['harvest']
+def today(ctx, format, mine, offline):
+    from cropper.records import TimeEntryTable
+    hobj = list_source(ctx, offline)
     try:
         user_id = ctx.obj['user_id'] if mine else None
         today = date.today().isoformat()
-        data = hobj.time_entries(user_id = user_id, _from = today)
+        data = hobj.iter_time_entries(user_id = user_id, _from = today)
 
         if format == "text":
+            data = TimeEntryTable().compact_all(data)
             data_by_user = {}
             for d in data:
-                user_name = d['user']['name'] 
-                if user_name in data_by_user:
-                    data_by_user[user_name].append(d)
+                # The account is only set when querying several
+                user = (d['account_id'], d['user']['name'])
+                if user in data_by_user:
+                    data_by_user[user].append(d)
                 else:
-                    data_by_user[user_name] = [d]
+                    data_by_user[user] = [d]
             
             headers = ['hours', 'project__name', 'task__name','notes', 'is_running']
             base_template = "{hours:<4.2f} | {is_running:1} | {project__name:<30s} | {task__name:<30s} | {notes}"
             for user in data_by_user:
+                account_id, user_name = user
                 if mine:
                     template = base_template
                 else:
-                    user_first = user.split(' ')[0]
+                    user_first = user_name.split(' ')[0]
                     template = "".join([f'{user_first:<10s}| ', base_template ])
+                if account_id is not None:
+                    template = f'{account_id!s:<10}| ' + template
                 print_list_objs(
                     data_by_user[user], 
                     headers,
@@ -400,7 +974,96 @@ def today(ctx, format, mine):
 
 
         else:
-            click.echo(json.dumps(data))
+            print_json_list(data)
     except Exception as e:
+        show_error(ctx, e)
+
+def run_line(ctx, line):
+    """
+    Runs a command line as a subcommand of the current context, so
+    it shares the client, its connections and its memoized responses.
+    Returns whether it succeeded.
+    """
+    import shlex
+    try:
+        args = shlex.split(line, comments=True)
+    except ValueError as e:
         click.secho(str(e), fg='red')
-        ctx.abort
+        return False
+    if not args:
+        return True
+    if args[0] in ('shell', 'batch'):
+        click.secho(f'{args[0]} can not be run from a shell or batch', fg='red')
+        return False
+
+    # Options like --fields or --checkpoint only apply to their command
+    for hobj in ctx.obj['harvests']:
+        hobj.projection = None
+        hobj.checkpoints = None
+    try:
+        ctx.obj['failed'] = False
+        cmd_name, cmd, args = cli.resolve_command(ctx, args)
+        with cmd.make_context(cmd_name, args, parent=ctx) as sub_ctx:
+            cmd.invoke(sub_ctx)
+    except click.exceptions.Exit as e:
+        return e.exit_code == 0
+    except click.ClickException as e:
+        e.show()
+        return False
+    except click.exceptions.Abort:
+        click.secho('Aborted', fg='red')
+        return False
+    return not ctx.obj['failed']
+
+@cli.command(name="shell", help="Run commands interactively in a single session, type exit or press Ctrl-D to quit")
+@click.option('--memo-ttl', 'memo_ttl', default=60, type=click.FloatRange(0), show_default=True,
+              help="Seconds to reuse the responses already fetched, until a command changes something")
+@click.pass_context
+def shell(ctx, memo_ttl):
+    try:
+        # History and line editing where available
+        import readline  # noqa: F401
+    except ImportError:
+        pass
+    ctx.obj['harvest'].memoize(memo_ttl)
+    click.echo('Type any cropper command without the cropper prefix, help to list them, refresh to forget the responses fetched or exit')
+    while True:
+        try:
+            line = input('cropper> ').strip()
+        except EOFError:
+            click.echo()
+            break
+        except KeyboardInterrupt:
+            click.echo()
+            continue
+        if line in ('exit', 'quit'):
+            break
+        elif line == 'help':
+            click.echo(cli.get_help(ctx.parent or ctx))
+        elif line == 'refresh':
+            ctx.obj['harvest'].memoize(memo_ttl)
+            ctx.obj.pop('index', None)
+        else:
+            try:
+                run_line(ctx.parent, line)
+            except KeyboardInterrupt:
+                click.echo()
+
+@cli.command(name="batch", help="Run the commands in a script, one per line, in a single session")
+@click.argument('script', type=click.File('r'), default='-')
+@click.option('--keep-going', 'keep_going', is_flag=True, default=False, help="Run the rest of the commands when one fails")
+@click.option('--memo-ttl', 'memo_ttl', default=60, type=click.FloatRange(0), show_default=True,
+              help="Seconds to reuse the responses already fetched, until a command changes something")
+@click.pass_context
+def batch(ctx, script, keep_going, memo_ttl):
+    ctx.obj['harvest'].memoize(memo_ttl)
+    failed = 0
+    for number, line in enumerate(script, start=1):
+        if run_line(ctx.parent, line):
+            continue
+        failed += 1
+        click.secho(f'Line {number} failed: {line.strip()}', fg='red', err=True)
+        if not keep_going:
+            break
+    if failed:
+        ctx.exit(1)
@@ -0,0 +1,39 @@
+class HarvestError(Exception):
+    """
+    Base class for all the errors raised by the Harvest client
+    """
+
+
+class HarvestConnectionError(HarvestError):
+    """
+    The Harvest API could not be reached
+    """
+
+
+class HarvestAPIError(HarvestError):
+    """
+    The Harvest API answered with an error status code
+    """
+
+    def __init__(self, endpoint, status_code, body=None):
+        super().__init__('Error accessing the {} endpoint (HTTP {})'.format(
+            endpoint, status_code))
+        self.endpoint = endpoint
+        self.status_code = status_code
+        self.body = body
+
+
+class HarvestRateLimitError(HarvestAPIError):
+    """
+    The Harvest API throttled the request (HTTP 429)
+    """
+
+    def __init__(self, endpoint, status_code, body=None, retry_after=None):
+        super().__init__(endpoint, status_code, body)
+        self.retry_after = retry_after
+
+
+class HarvestServerError(HarvestAPIError):
+    """
+    The Harvest API failed to process the request (HTTP 5xx)
+    """
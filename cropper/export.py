@@ -0,0 +1,275 @@
+import csv
+import gzip
+import io
+import re
+
+from cropper import jsonlib
+
+# The columns exported by default, nested keys are declared with
+# double underscores like in the renderers
+EXPORT_FIELDS = {
+    'time_entries': [
+        'id', 'spent_date', 'hours', 'notes', 'is_running', 'is_billed', 'billable',
+        'user__id', 'user__name', 'client__id', 'client__name', 'project__id',
+        'project__name', 'task__id', 'task__name', 'created_at', 'updated_at'],
+    'projects': [
+        'id', 'name', 'code', 'client__id', 'client__name', 'is_active', 'is_billable',
+        'budget', 'created_at', 'updated_at'],
+    'users': [
+        'id', 'first_name', 'last_name', 'email', 'is_active', 'is_admin', 'created_at', 'updated_at'],
+    'clients': [
+        'id', 'name', 'is_active', 'currency', 'created_at', 'updated_at'],
+}
+
+# The type of every field Harvest documents for these resources,
+# nested keys with double underscores. Any other field is exported
+# as text, nested objects as JSON.
+FIELD_TYPES = {
+    'id': 'int', 'name': 'str', 'code': 'str', 'notes': 'str', 'email': 'str',
+    'first_name': 'str', 'last_name': 'str', 'telephone': 'str', 'timezone': 'str',
+    'currency': 'str', 'address': 'str', 'statement_key': 'str', 'avatar_url': 'str',
+    'bill_by': 'str', 'budget_by': 'str', 'locked_reason': 'str',
+    'started_time': 'str', 'ended_time': 'str',
+    'spent_date': 'date', 'starts_on': 'date', 'ends_on': 'date',
+    'created_at': 'timestamp', 'updated_at': 'timestamp', 'timer_started_at': 'timestamp',
+    'hours': 'float', 'hours_without_timer': 'float', 'rounded_hours': 'float',
+    'billable_rate': 'float', 'cost_rate': 'float', 'budget': 'float', 'cost_budget': 'float',
+    'hourly_rate': 'float', 'fee': 'float', 'default_hourly_rate': 'float',
+    'over_budget_notification_percentage': 'float', 'weekly_capacity': 'int',
+    'is_active': 'bool', 'is_billable': 'bool', 'is_fixed_fee': 'bool', 'is_running': 'bool',
+    'is_billed': 'bool', 'is_locked': 'bool', 'is_closed': 'bool', 'billable': 'bool',
+    'budgeted': 'bool', 'is_admin': 'bool', 'is_project_manager': 'bool', 'is_contractor': 'bool',
+    'budget_is_monthly': 'bool', 'notify_when_over_budget': 'bool', 'show_budget_to_all': 'bool',
+    'cost_budget_include_expenses': 'bool', 'has_access_to_all_future_projects': 'bool',
+    'can_see_rates': 'bool', 'can_create_projects': 'bool', 'can_create_invoices': 'bool',
+    'user__id': 'int', 'user__name': 'str', 'client__id': 'int', 'client__name': 'str',
+    'client__currency': 'str', 'project__id': 'int', 'project__name': 'str',
+    'project__code': 'str', 'task__id': 'int', 'task__name': 'str',
+    'user_assignment__id': 'int', 'task_assignment__id': 'int',
+    'invoice__id': 'int', 'invoice__number': 'str',
+}
+
+DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+TIMESTAMP = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z$')
+
+
+def compile_getter(spec):
+    """
+    Compiles a field spec like 'client__name' into a function that
+    reads that value from an object, None if any part is missing
+    """
+    parts = spec.split('__')
+
+    def getter(obj):
+        for part in parts:
+            if not isinstance(obj, dict):
+                return None
+            obj = obj.get(part)
+        return obj
+    return getter
+
+
+def text(value):
+    """
+    Converts a value of a text column, nested objects as JSON
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return jsonlib.dumps(value)
+    return str(value)
+
+
+def compile_converter(spec, column_type):
+    """
+    Returns a function checking that a value of a column has its
+    type, converting integers of decimal columns to floats and any
+    value of text columns to text. A value of another type raises
+    ValueError instead of being truncated.
+    """
+    if column_type == 'str':
+        return text
+
+    def accepts(value):
+        if column_type == 'bool':
+            return type(value) is bool
+        if column_type == 'int':
+            return type(value) is int
+        if column_type == 'float':
+            return type(value) in (int, float)
+        pattern = DATE if column_type == 'date' else TIMESTAMP
+        return isinstance(value, str) and pattern.match(value) is not None
+
+    def convert(value):
+        if value is None:
+            return None
+        if not accepts(value):
+            raise ValueError('The {} column holds {} values, got {!r}'.format(spec, column_type, value))
+        return float(value) if column_type == 'float' else value
+    return convert
+
+
+class CSVWriter(object):
+    """
+    Writes the chunks as rows of a CSV file, gzip compressed or not
+    """
+
+    def __init__(self, path, compress=True, compresslevel=6, name=None):
+        """
+        Parameters:
+            path (str): the file to write
+            compress (bool): compress the file with gzip
+            compresslevel (int): gzip compression, from 1 to 9
+            name (str): the file name kept in the gzip header, the
+                        path by default
+        """
+        self.path = path
+        self.compress = compress
+        self.compresslevel = compresslevel
+        self.name = name or path
+        self.raw = None
+        self.stream = None
+
+    def open(self, headers, types):
+        if self.compress:
+            self.raw = open(self.path, 'wb')
+            compressed = gzip.GzipFile(filename=self.name, mode='wb',
+                                       compresslevel=self.compresslevel, fileobj=self.raw)
+            self.stream = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+        else:
+            self.stream = open(self.path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow(headers)
+        self.bools = [column_type == 'bool' for column_type in types]
+
+    def write(self, columns):
+        # As true and false, the literals CSV loaders take as booleans
+        columns = [[None if value is None else ('true' if value else 'false') for value in values]
+                   if is_bool else values
+                   for values, is_bool in zip(columns, self.bools)]
+        self.writer.writerows(zip(*columns))
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+        # GzipFile leaves the file it writes to open
+        if self.raw:
+            self.raw.close()
+
+
+class ArrowWriter(object):
+    """
+    Writes the chunks as record batches of an Arrow IPC file, or as
+    row groups of a Parquet file
+    """
+
+    def __init__(self, path, parquet=False, compression=None):
+        """
+        Parameters:
+            path (str): the file to write
+            parquet (bool): write Parquet instead of Arrow
+            compression (str): the codec, snappy for Parquet and
+                               none for Arrow by default
+        """
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('Exporting to Arrow or Parquet needs pyarrow, install harvest-cropper[arrow]')
+        self.pa = pyarrow
+        self.path = path
+        self.parquet = parquet
+        self.compression = compression
+        self.writer = None
+
+    def _arrow_type(self, column_type):
+        pa = self.pa
+        return {
+            'bool': pa.bool_(),
+            'int': pa.int64(),
+            'float': pa.float64(),
+            'date': pa.date32(),
+            'timestamp': pa.timestamp('s', tz='UTC'),
+            'str': pa.string()
+        }[column_type]
+
+    def open(self, headers, types):
+        pa = self.pa
+        self.schema = pa.schema([pa.field(header, self._arrow_type(column_type))
+                                 for header, column_type in zip(headers, types)])
+        if self.parquet:
+            import pyarrow.parquet
+            self.writer = pyarrow.parquet.ParquetWriter(
+                self.path, self.schema, compression=self.compression or 'snappy')
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            self.writer = pa.ipc.new_file(self.path, self.schema, options=options)
+
+    def _array(self, values, field):
+        pa = self.pa
+        if pa.types.is_date(field.type) or pa.types.is_timestamp(field.type):
+            # Dates and timestamps are parsed by Arrow from the ISO strings
+            return pa.array(values, type=pa.string()).cast(field.type)
+        return pa.array(values, type=field.type)
+
+    def write(self, columns):
+        batch = self.pa.record_batch(
+            [self._array(values, field) for values, field in zip(columns, self.schema)],
+            schema=self.schema)
+        if self.parquet:
+            # A row group per chunk
+            self.writer.write_table(self.pa.Table.from_batches([batch]), row_group_size=batch.num_rows)
+        else:
+            self.writer.write_batch(batch)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+class ChunkedExport(object):
+    """
+    Writes objects to a file in chunks of a fixed number of rows as
+    they arrive, so memory stays the same whatever the size of the
+    export. The type of every column is given by FIELD_TYPES.
+    """
+
+    def __init__(self, writer, headers, chunk_size=10000):
+        """
+        Parameters:
+            writer (CSVWriter or ArrowWriter): what writes the chunks
+            headers (list): the field specs to export, nested keys
+                            are declared with double underscores
+            chunk_size (int): rows per chunk
+        """
+        self.writer = writer
+        self.headers = list(headers)
+        self.getters = [compile_getter(header) for header in self.headers]
+        self.chunk_size = chunk_size
+        self.types = [FIELD_TYPES.get(header, 'str') for header in self.headers]
+        self.converters = [compile_converter(header, column_type)
+                           for header, column_type in zip(self.headers, self.types)]
+        self.rows = 0
+
+    def _flush(self, columns):
+        if columns[0]:
+            self.writer.write([list(map(convert, values))
+                               for values, convert in zip(columns, self.converters)])
+            self.rows += len(columns[0])
+
+    def write_all(self, objs):
+        """
+        Writes an iterable of objects, returns the number of rows
+        """
+        columns = [[] for _ in self.getters]
+        self.writer.open(self.headers, self.types)
+        try:
+            for obj in objs:
+                for column, getter in zip(columns, self.getters):
+                    column.append(getter(obj))
+                if len(columns[0]) >= self.chunk_size:
+                    self._flush(columns)
+                    columns = [[] for _ in self.getters]
+            self._flush(columns)
+        finally:
+            self.writer.close()
+        return self.rows
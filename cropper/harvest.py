@@ -1,47 +1,577 @@
+import math
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
 import requests
 
+from cropper import jsonlib
+from cropper.exceptions import (HarvestAPIError, HarvestConnectionError,
+                                HarvestRateLimitError, HarvestServerError)
+from cropper.ratelimit import TokenBucket
+from cropper.stats import RequestRecord
+from cropper.transport import HTTPTransport
+
 
-class Harvest(object):
+class BaseHarvest(object):
     """
-    A class to interact with Harvest returning JSON objects from its API
+    The parts of a Harvest API client that don't depend on how
+    requests are sent: the API limits, the endpoint and parameters of
+    every resource, how errors are classified and when to retry them.
+    Shared by Harvest and AsyncHarvest.
     """
 
     API_URL = "https://api.harvestapp.com/api/v2/"
+    PER_PAGE = 100
+
+    # Harvest allows 100 requests every 15 seconds per token
+    RATE_LIMIT = 100
+    RATE_PERIOD = 15
+
+    MAX_RETRIES = 5
+    BACKOFF_BASE = 1
+    BACKOFF_MAX = 60
+
+    # Filters the /time_entries endpoint understands, any other
+    # filter is applied to the fetched entries
+    TIME_ENTRIES_FILTERS = (
+        'user_id', 'client_id', 'project_id', 'task_id', 'external_reference_id',
+        'is_billed', 'is_running', 'approval_status', 'updated_since', 'from', 'to')
+
+    def __init__(self, logger, accountid, concurrency=1, api_url=None, rate_limit=None):
+        """
+        Parameters:
+            logger (logging): a logger to use
+            accountid (int): the account identifier
+            concurrency (int): how many pages of a paged endpoint
+                               can be requested at the same time
+            api_url (str): the API base url, to use a stand-in server
+            rate_limit (int): requests allowed every RATE_PERIOD
+                              seconds, RATE_LIMIT by default
+        """
+        self.logger = logger
+        self.accountid = accountid
+        self.concurrency = max(1, concurrency)
+        if api_url:
+            self.API_URL = api_url if api_url.endswith('/') else api_url + '/'
+        # Shared by every request of this instance, whatever the thread
+        self.limiter = TokenBucket(rate_limit or self.RATE_LIMIT, self.RATE_PERIOD)
+        # Callables getting a RequestRecord after every request sent
+        self.hooks = []
+
+    @staticmethod
+    def _auth_headers(token, accountid):
+        return {
+            'Harvest-Account-ID': str(accountid),
+            'Authorization': 'Bearer {}'.format(token)
+        }
+
+    def _backoff(self, attempt):
+        """
+        Seconds to wait before the given retry, growing exponentially
+        with full jitter so concurrent callers don't retry in lockstep
+        """
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** attempt))
+
+    def _error(self, endpoint, status, headers, text):
+        """
+        Builds the exception matching an error response
+
+        Parameters:
+            endpoint (str): the API endpoint url section
+            status (int): the response status code
+            headers (dict): the response headers
+            text (str): the response body
+        """
+        if status == 429:
+            retry_after = headers.get('Retry-After')
+            try:
+                retry_after = float(retry_after)
+            except (TypeError, ValueError):
+                retry_after = None
+            return HarvestRateLimitError(endpoint, status, text, retry_after)
+        elif status >= 500:
+            return HarvestServerError(endpoint, status, text)
+        else:
+            return HarvestAPIError(endpoint, status, text)
+
+    def _notify(self, method, endpoint, parameters, status, started, size, attempt):
+        """
+        Reports a request to the instance hooks
+
+        Parameters:
+            method (str): the HTTP method
+            endpoint (str): the API endpoint url section
+            parameters (dict): the parameters of the request
+            status (int): the response status code, None if the
+                          request failed before getting one
+            started (float): the perf_counter when it was sent
+            size (int): the bytes of the response body as they
+                        came over the network, compressed or not
+            attempt (int): how many times the request was retried
+        """
+        if not self.hooks:
+            return
+        record = RequestRecord(
+            method, endpoint, status, time.perf_counter() - started, size,
+            parameters.get('page'), attempt, started)
+        for hook in self.hooks:
+            hook(record)
+
+    def _connection_error(self, endpoint, error):
+        return HarvestConnectionError(
+            'Error connecting to the {} endpoint: {}'.format(endpoint, str(error) or type(error).__name__))
+
+    def _retry_delay(self, error, attempt):
+        """
+        Returns the seconds to wait before retrying a failed request,
+        raising the error when it should not be retried
+
+        Parameters:
+            error (HarvestError): why the request failed
+            attempt (int): how many times the request was retried
+        """
+        if isinstance(error, HarvestRateLimitError):
+            delay = error.retry_after
+            if delay is None:
+                delay = self._backoff(attempt)
+            # Nobody else in this instance should keep hitting the API
+            self.limiter.pause(delay)
+        elif isinstance(error, (HarvestServerError, HarvestConnectionError)):
+            delay = self._backoff(attempt)
+        else:
+            raise error
+
+        if attempt >= self.MAX_RETRIES:
+            raise error
+        self.logger.warning('{}, retrying in {:.1f}s ({}/{})'.format(
+            error, delay, attempt + 1, self.MAX_RETRIES))
+        return delay
+
+    def _page_parameters(self, parameters, page):
+        return {**parameters, **{'per_page': self.PER_PAGE, 'page': page}}
 
-    def __init__(self, logger, token, accountid):
+    def _next_pages(self, endpoint, parameters, start_page, total_pages):
+        """
+        Returns the endpoint and parameters of the pages of a paged
+        endpoint after the first one fetched
+        """
+        return ((endpoint, self._page_parameters(parameters, page))
+                for page in range(start_page+1, total_pages+1))
+
+    def _in_flight(self, calls, submit):
+        """
+        Private generator that submits the calls, keeping at most
+        `concurrency` of them in flight, and yields their futures in
+        order. The caller waits for every future before asking for
+        the next one, and closes the generator to cancel the rest.
+
+        Parameters:
+            calls (iterable): the arguments of every call
+            submit (callable): starts a call, returning its future
+        """
+        calls = iter(calls)
+        pending = deque()
+        try:
+            for call in islice(calls, self.concurrency):
+                pending.append(submit(*call))
+            while pending:
+                yield pending[0]
+                pending.popleft()
+                for call in islice(calls, 1):
+                    pending.append(submit(*call))
+        finally:
+            # Don't keep fetching pages nobody is going to read
+            for future in pending:
+                future.cancel()
+
+    def _total_pages(self, first_request):
+        """
+        Reads the number of pages of a paged endpoint from its first page
+        """
+        total_pages = first_request['total_pages']
+        if total_pages > 1:
+            self.logger.debug('The request needs up to {} paged requests for a total of {} entries'.format(
+                total_pages, first_request['total_entries']))
+        return total_pages
+
+    @staticmethod
+    def _active_parameters(active, updated_since=None):
+        params = {}
+        if active == 'active':
+            params['is_active'] = "true"
+        elif active == 'inactive':
+            params['is_active'] = "false"
+
+        if updated_since:
+            params['updated_since'] = updated_since
+        return params
+
+    def _projects_request(self, active, client=None, updated_since=None):
+        params = self._active_parameters(active, updated_since)
+        if client:
+            params['client_id'] = client
+        return '/projects', 'projects', params
+
+    def _clients_request(self, active="all", updated_since=None):
+        return '/clients', 'clients', self._active_parameters(active, updated_since)
+
+    def _users_request(self, active="all", updated_since=None):
+        return '/users', 'users', self._active_parameters(active, updated_since)
+
+    def _task_assignments_request(self, projectid=None):
+        if projectid:
+            endpoint = 'projects/{}/task_assignments'.format(projectid)
+        else:
+            endpoint = '/task_assignments'
+        return endpoint, 'task_assignments', {}
+
+    def _time_entries_request(self, **kwargs):
+        params = {}
+        for key, value in kwargs.items():
+            if value:
+                if key == "_from":
+                    params['from'] = value
+                elif key in self.TIME_ENTRIES_FILTERS:
+                    params[key] = value
+        return '/time_entries', 'time_entries', params
+
+    def _time_entries_filter(self, **kwargs):
+        """
+        Returns a function to check the filters the API can't apply
+        on a time entry, or None if all of them were sent to the API.
+        Nested values are addressed with double underscores, so
+        task__name='Meetings' checks entry['task']['name'].
+        """
+        local = {key: value for key, value in kwargs.items()
+                 if value and key != '_from' and key not in self.TIME_ENTRIES_FILTERS}
+        if not local:
+            return None
+
+        def matches(entry):
+            for key, value in local.items():
+                current = entry
+                for part in key.split('__'):
+                    current = current.get(part) if isinstance(current, dict) else None
+                if current != value:
+                    return False
+            return True
+        return matches
+
+    def _update_time_entry_request(self, time_entry_id, project_id, task_id, notes=None):
+        params = {
+            'project_id': project_id,
+            'task_id': task_id
+        }
+
+        if notes:
+            params['notes'] = notes
+        return '/time_entries/{}'.format(time_entry_id), params
+
+
+class Harvest(BaseHarvest):
+    """
+    A class to interact with Harvest returning JSON objects from its API
+    """
+
+    # Most responses kept in memory when memoizing, pages of up to
+    # PER_PAGE objects
+    MEMO_SIZE = 500
+
+    # Seconds a cached response of these resources is used without
+    # asking the API, once expired it is revalidated with its ETag
+    CACHE_TTLS = {
+        'clients': 3600,
+        'users': 3600,
+        'projects': 600,
+        'task_assignments': 600
+    }
+
+    def __init__(self, logger, token, accountid, concurrency=1, cache=None,
+                 api_url=None, rate_limit=None, transport=None):
         """
         The constructor gets a logger and the credentials to
-        store at the instance a requests Session with the 
-        proper headers to authenticate against Harvest API.
+        authenticate against Harvest API, and the transport to
+        send the requests with.
 
         Parameters:
             logger (logging): a logger to use
             token (str): the auth token
             accountid (int): the account identifier
+            concurrency (int): how many pages of a paged endpoint
+                               can be requested at the same time
+            cache (ResponseCache): where to keep the responses of
+                                   the resources in CACHE_TTLS
+            api_url (str): the API base url, to use a stand-in server
+            rate_limit (int): requests allowed every RATE_PERIOD
+                              seconds, RATE_LIMIT by default
+            transport (HTTPTransport): what sends the requests, by
+                                       default a pool with a
+                                       connection per worker
         """
-        self.logger = logger
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Harvest-Account-ID': accountid,
-            'Authorization': 'Bearer {}'.format(token)
-        })
+        super().__init__(logger, accountid, concurrency, api_url, rate_limit)
+        self.cache = cache
+        self.headers = self._auth_headers(token, accountid)
+        if transport is None:
+            # Let every worker keep its own connection alive
+            transport = HTTPTransport(pool_size=max(10, self.concurrency))
+        self.transport = transport
+        # A CheckpointStore to spool the paged results to, if any
+        self.checkpoints = None
+        # A jsonlib.Projection to apply to every page as it arrives
+        self.projection = None
+        # Responses kept in memory when memoizing, see memoize
+        self.memo = None
+        self.memo_ttl = None
+        self.memo_lock = threading.Lock()
+
+    def _send(self, method, endpoint, parameters={}, headers=None):
+        """
+        Private method to send a request to a Harvest API endpoint,
+        pacing it with the instance rate limiter and retrying
+        throttled, failed and unreachable requests. Returns the
+        successful (or not modified) response.
+
+        Parameters:
+            method (str): the HTTP method
+            endpoint (str): the API endpoint url section
+            parameters (dict): the parameters to add to the request
+            headers (dict): extra headers to send
+        """
+        url = self.API_URL + endpoint
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                r = self.transport.request(
+                    method, url, parameters, {**self.headers, **(headers or {})})
+            except requests.exceptions.RequestException as e:
+                self._notify(method, endpoint, parameters, None, started, 0, attempt)
+                error = self._connection_error(endpoint, e)
+            else:
+                self._notify(method, endpoint, parameters, r.status_code, started,
+                             self._wire_size(r), attempt)
+                if r.status_code == 200 or (r.status_code == 304 and headers):
+                    return r
+                self.logger.debug(r.text)
+                error = self._error(endpoint, r.status_code, r.headers, r.text)
+
+            delay = self._retry_delay(error, attempt)
+            attempt += 1
+            time.sleep(delay)
+
+    def _wire_size(self, r):
+        """
+        Returns the bytes of a response body as they came over the
+        network, r.content holds them already decompressed
+        """
+        length = r.headers.get('Content-Length')
+        if length and length.isdigit():
+            return int(length)
+        # The bytes urllib3 read, missing in replayed responses
+        tell = getattr(r.raw, 'tell', None)
+        if tell is not None:
+            return tell()
+        return len(r.content)
+
+    def _request(self, method, endpoint, parameters={}):
+        """
+        Private method to send a request to a Harvest API endpoint
+        and decode its JSON response
+
+        Parameters:
+            method (str): the HTTP method
+            endpoint (str): the API endpoint url section
+            parameters (dict): the parameters to add to the request
+        """
+        result = jsonlib.loads(self._send(method, endpoint, parameters).content)
+        if method != 'GET' and self.memo:
+            # Anything read before the change may be outdated now
+            with self.memo_lock:
+                self.memo.clear()
+        return result
+
+    def _cache_ttl(self, endpoint):
+        """
+        Returns the cache TTL of an endpoint or None if its
+        responses should not be cached
+        """
+        if self.cache is None:
+            return None
+        parts = endpoint.strip('/').split('/')
+        resource = parts[-2] if parts[-1].isdigit() and len(parts) > 1 else parts[-1]
+        return self.CACHE_TTLS.get(resource)
+
+    def memoize(self, ttl=60):
+        """
+        Keeps the responses in memory to answer the same requests
+        again without calling the API, for up to `ttl` seconds or
+        until a request changes something
+
+        Parameters:
+            ttl (float): seconds a response is reused
+        """
+        self.memo = {}
+        self.memo_ttl = ttl
 
     def _call(self, endpoint, parameters={}):
         """
         Private method to call a Harvest API endpoint
 
+        Parameters:
+            endpoint (str): the API endpoint url section
+            parameters (dict): the parameters to add to the GET request
+        """
+        if self.memo is None or 'updated_since' in parameters:
+            return self._cached_call(endpoint, parameters)
+
+        key = (endpoint, tuple(sorted(parameters.items())))
+        with self.memo_lock:
+            memoized = self.memo.get(key)
+        if memoized and time.monotonic() - memoized[0] < self.memo_ttl:
+            return memoized[1]
+        result = self._cached_call(endpoint, parameters)
+        with self.memo_lock:
+            now = time.monotonic()
+            self.memo.pop(key, None)
+            self.memo[key] = (now, result)
+            # The oldest responses come first, forget the expired ones
+            # and any beyond MEMO_SIZE
+            while self.memo:
+                oldest, (stored, _) = next(iter(self.memo.items()))
+                if len(self.memo) <= self.MEMO_SIZE and now - stored < self.memo_ttl:
+                    break
+                del self.memo[oldest]
+        return result
+
+    def _cached_call(self, endpoint, parameters={}):
+        """
+        Private method to call a Harvest API endpoint through the
+        response cache
+
         Parameters:
             endpoint (str): the API endpoint url section
             parameters (dict): the parameters to add to the GET request
         """
         self.logger.debug(
             'Making a request to the endpoint {} with parameters: {}'.format(endpoint, str(parameters)))
-        r = self.session.get(url=self.API_URL + endpoint, params=parameters)
-        if r.status_code == 200:
-            return r.json()
-        else:
-            self.logger.debug(r.text)
-            raise Exception('Error accessing the {} endpoint'.format(endpoint))
+        ttl = self._cache_ttl(endpoint)
+        # Incremental queries are not worth keeping
+        if ttl is None or 'updated_since' in parameters:
+            return self._request('GET', endpoint, parameters)
+
+        key = self.cache.key(self.accountid, endpoint, parameters)
+        cached = self.cache.get(key)
+        headers = {}
+        if cached:
+            if cached['age'] < ttl:
+                self.cache.hit(key)
+                return jsonlib.loads(cached['body'])
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        r = self._send('GET', endpoint, parameters, headers)
+        if r.status_code == 304:
+            self.logger.debug('The cached response is still valid')
+            self.cache.hit(key, revalidated=True)
+            return jsonlib.loads(cached['body'])
+
+        self.cache.set(key, endpoint, r.text,
+                       r.headers.get('ETag'), r.headers.get('Last-Modified'))
+        return jsonlib.loads(r.content)
+
+    def _conditional_call(self, endpoint, parameters={}, etag=None):
+        """
+        Private method to call a Harvest API endpoint only downloading
+        the response when it changed since the one with the given ETag.
+        Returns the new ETag and the JSON response, or None if it
+        didn't change.
+
+        Parameters:
+            endpoint (str): the API endpoint url section
+            parameters (dict): the parameters to add to the GET request
+            etag (str): the ETag of the last response seen
+        """
+        headers = {'If-None-Match': etag} if etag else {}
+        r = self._send('GET', endpoint, parameters, headers)
+        if r.status_code == 304:
+            return etag, None
+        return r.headers.get('ETag'), jsonlib.loads(r.content)
+
+    def _page_objects(self, request, objectid, projection=None):
+        """
+        Extracts the objects of a page, keeping only the projected
+        fields so the decoded page can be released right away.
+        The instance projection is used unless another one is given.
+        """
+        objects = request[objectid]
+        projection = projection or self.projection
+        return projection.page(objects) if projection else objects
+
+    def _iter_pages(self, endpoint, objectid, parameters={}, start_page=1):
+        """
+        Private generator that yields the list of objects of every
+        page of a paged endpoint, in page order.
+
+        When the instance concurrency is greater than one, the pages
+        after the first one are fetched by a pool of workers, keeping
+        at most `concurrency` pages in flight so memory stays bounded
+        no matter how many pages the endpoint has.
+
+        Parameters:
+            endpoint (str): the API endpoint url section
+            objectid (str): the key of the array to extract from 
+                            the returning JSON
+            parameters (dict): the parameters to add to the GET request 
+            start_page (int): the first page to fetch
+        """
+        first_request = self._call(
+            endpoint, self._page_parameters(parameters, start_page))
+        total_pages = self._total_pages(first_request)
+        yield self._page_objects(first_request, objectid)
+        del first_request
+
+        if total_pages <= start_page:
+            return
+
+        calls = self._next_pages(endpoint, parameters, start_page, total_pages)
+        if self.concurrency == 1:
+            for call in calls:
+                yield self._page_objects(self._call(*call), objectid)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = self._in_flight(calls, lambda *call: executor.submit(self._call, *call))
+            try:
+                for future in futures:
+                    yield self._page_objects(future.result(), objectid)
+            finally:
+                futures.close()
+
+    def _iter_paged_results(self, endpoint, objectid, parameters={}):
+        """
+        Private generator that yields one by one all the results
+        of a paged endpoint, requesting the pages as they are consumed.
+        With checkpoints every page is saved before reading it.
+
+        Parameters:
+            endpoint (str): the API endpoint url section
+            objectid (str): the key of the array to extract from 
+                            the returning JSON
+            parameters (dict): the parameters to add to the GET request 
+        """
+        if self.checkpoints is not None:
+            yield from self.checkpoints.iter_results(self, endpoint, objectid, parameters)
+            return
+        for page in self._iter_pages(endpoint, objectid, parameters):
+            yield from page
 
     def _get_paged_results(self, endpoint, objectid, parameters={}):
         """
@@ -53,20 +583,7 @@ class Harvest(object):
                             the returning JSON
             parameters (dict): the parameters to add to the GET request 
         """
-
-        first_request = self._call(
-            endpoint, {**parameters, **{'per_page': 100, 'page': 1}})
-        results = first_request[objectid]
-        total_pages = first_request['total_pages']
-        entries = first_request['total_entries']
-        if total_pages > 1:
-            self.logger.debug('The request needs up to {} paged requests for a total of {} entries'.format(
-                total_pages, entries))
-            for page in range(2, total_pages+1):
-                request = self._call(
-                    endpoint, {**parameters, **{'per_page': 100, 'page': page}})
-                results = results + request[objectid]
-        return results
+        return list(self._iter_paged_results(endpoint, objectid, parameters))
 
     def check(self):
         """
@@ -74,7 +591,7 @@ class Harvest(object):
         """
         return self._call('/users/me.json')
 
-    def projects(self, active, client=None):
+    def projects(self, active, client=None, updated_since=None):
         """
         Gets a list of projects
 
@@ -83,17 +600,25 @@ class Harvest(object):
                           projects
             client (int): return the projects linked to an specific
                           client
+            updated_since (str): only the projects updated since
+                                 this ISO 8601 date time
         """
-        params = {}
-        if active == 'active':
-            params['is_active'] = "true"
-        elif active == 'inactive':
-            params['is_active'] = "false"
+        return list(self.iter_projects(active, client, updated_since))
 
-        if client:
-            params['client_id'] = client
+    def iter_projects(self, active, client=None, updated_since=None):
+        """
+        Iterates over the projects, fetching pages as they are consumed
 
-        return self._get_paged_results('/projects', 'projects', params)
+        Parameters:
+            active (str): gets the list of active, inactive or all
+                          projects
+            client (int): return the projects linked to an specific
+                          client
+            updated_since (str): only the projects updated since
+                                 this ISO 8601 date time
+        """
+        return self._iter_paged_results(
+            *self._projects_request(active, client, updated_since))
 
     def project(self, project_id):
         """
@@ -110,35 +635,51 @@ class Harvest(object):
         """
         return self._call('/company')
 
-    def clients(self, active="all"):
+    def clients(self, active="all", updated_since=None):
         """
         Gets a list of clients
 
         Parameters:
             active (str): filter the active clients (all, inactive, active)
+            updated_since (str): only the clients updated since this
+                                 ISO 8601 date time
         """
-        params = {}
-        if active == 'active':
-            params['is_active'] = "true"
-        elif active == 'inactive':
-            params['is_active'] = "false"
+        return list(self.iter_clients(active, updated_since))
 
-        return self._get_paged_results('/clients', 'clients', params)
+    def iter_clients(self, active="all", updated_since=None):
+        """
+        Iterates over the clients, fetching pages as they are consumed
 
-    def users(self, active="all"):
+        Parameters:
+            active (str): filter the active clients (all, inactive, active)
+            updated_since (str): only the clients updated since this
+                                 ISO 8601 date time
+        """
+        return self._iter_paged_results(
+            *self._clients_request(active, updated_since))
+
+    def users(self, active="all", updated_since=None):
         """
         Gets a list of users
 
         Parameters:
             active (str): filter the active users (all, inactive, active)
+            updated_since (str): only the users updated since this
+                                 ISO 8601 date time
         """
-        params = {}
-        if active == 'active':
-            params['is_active'] = "true"
-        elif active == 'inactive':
-            params['is_active'] = "false"
+        return list(self.iter_users(active, updated_since))
+
+    def iter_users(self, active="all", updated_since=None):
+        """
+        Iterates over the users, fetching pages as they are consumed
 
-        return self._get_paged_results('/users', 'users', params)
+        Parameters:
+            active (str): filter the active users (all, inactive, active)
+            updated_since (str): only the users updated since this
+                                 ISO 8601 date time
+        """
+        return self._iter_paged_results(
+            *self._users_request(active, updated_since))
 
     def task_assignments(self, projectid=None):
         """
@@ -147,11 +688,18 @@ class Harvest(object):
         Parameters:
             projectid (int): the project identifier
         """
-        if projectid:
-            endpoint = 'projects/{}/task_assignments'.format(projectid)
-        else:
-            endpoint = '/task_assignments'
-        return self._get_paged_results(endpoint, 'task_assignments')
+        return list(self.iter_task_assignments(projectid))
+
+    def iter_task_assignments(self, projectid=None):
+        """
+        Iterates over the tasks associated to a project, fetching
+        pages as they are consumed
+
+        Parameters:
+            projectid (int): the project identifier
+        """
+        return self._iter_paged_results(
+            *self._task_assignments_request(projectid))
 
     def time_entries(self, **kwargs):
         """
@@ -160,15 +708,159 @@ class Harvest(object):
         Parameters:
             projectid (int): the project identifier
         """
-        params = {}
-        for key, value in kwargs.items():
-            if value:
-                if key == "_from":
-                    params['from'] = value
-                else:
-                    params[key] = value
+        return list(self.iter_time_entries(**kwargs))
 
-        return self._get_paged_results('/time_entries', 'time_entries', params)
+    def iter_time_entries(self, shard_size=None, **kwargs):
+        """
+        Iterates over the timesheet entries matching the filters
+        given as keyword arguments, fetching pages as they are consumed.
+        Filters in TIME_ENTRIES_FILTERS are sent to the API, the rest
+        are applied to the entries as they arrive.
+
+        Parameters:
+            shard_size (int): split the date range in windows of
+                              about this many entries fetched on
+                              their own, see _iter_time_entry_windows
+        """
+        if shard_size:
+            results = self._iter_time_entry_windows(
+                *self._time_entries_request(**kwargs), shard_size)
+        else:
+            results = self._iter_paged_results(
+                *self._time_entries_request(**kwargs))
+        matches = self._time_entries_filter(**kwargs)
+        return filter(matches, results) if matches else results
+
+    @staticmethod
+    def _split_window(start, end, parts):
+        """
+        Splits a window of dates in consecutive windows of about the
+        same number of days, the most recent one first as Harvest
+        sorts the time entries
+        """
+        days = (end - start).days + 1
+        parts = max(1, min(days, parts))
+        bounds = [start + timedelta(days=days * part // parts) for part in range(parts + 1)]
+        return [(bounds[part], bounds[part + 1] - timedelta(days=1)) for part in reversed(range(parts))]
+
+    def _date_bounds(self, endpoint, objectid, parameters):
+        """
+        Returns the first and last dates with entries matching the
+        parameters, asking for a single entry per page, or None if
+        there are no entries
+        """
+        def spent_date(page):
+            request = self._call(endpoint, {**parameters, 'per_page': 1, 'page': page})
+            return request[objectid][0]['spent_date'] if request[objectid] else None, request
+
+        last, request = spent_date(1)
+        if last is None:
+            return None
+        first, page = None, request['total_entries']
+        while first is None and page > 1:
+            # The last entries can be deleted meanwhile
+            first, _ = spent_date(page)
+            page -= 1
+        return (datetime.strptime(parameters.get('from') or first or last, '%Y-%m-%d').date(),
+                datetime.strptime(parameters.get('to') or last, '%Y-%m-%d').date())
+
+    def _fetch_window(self, endpoint, objectid, parameters, window, shard_size, projection=None):
+        """
+        Fetches all the entries of a window of dates, unless it has
+        more than shard_size of them. Returns the entries, or the
+        smaller windows to fetch instead.
+        """
+        start, end = window
+        parameters = {**parameters, 'from': start.isoformat(), 'to': end.isoformat()}
+        first_request = self._call(endpoint, self._page_parameters(parameters, 1))
+        total = first_request['total_entries']
+        if total > shard_size and start < end:
+            self.logger.debug('{} entries from {} to {}, splitting the window'.format(total, start, end))
+            return self._split_window(start, end, math.ceil(total / shard_size)), None
+        # A new list, the page may be memoized
+        results = list(self._page_objects(first_request, objectid, projection))
+        for page in range(2, first_request['total_pages'] + 1):
+            results.extend(self._page_objects(
+                self._call(endpoint, self._page_parameters(parameters, page)), objectid, projection))
+        return None, results
+
+    def _iter_time_entry_windows(self, endpoint, objectid, parameters, shard_size):
+        """
+        Private generator that yields the time entries of a date
+        range split in windows of about shard_size entries, newest
+        first. Paging through a long range shifts the pages when
+        entries change meanwhile, duplicating or skipping some. Every
+        window is paged on its own instead, `concurrency` of them at
+        once, windows with too many entries are split again according
+        to their total_entries, and the entries are merged without
+        duplicates.
+
+        Parameters:
+            endpoint (str): the API endpoint url section
+            objectid (str): the key of the array to extract from
+                            the returning JSON
+            parameters (dict): the parameters to add to the GET request
+            shard_size (int): the most entries to page through in
+                              a single window
+        """
+        bounds = self._date_bounds(endpoint, objectid, parameters)
+        if bounds is None:
+            return
+        # The entries are merged by id, keep it until then if the
+        # projection leaves it out
+        projection = self.projection
+        strip_id = projection is not None and 'id' not in projection.tree
+        if strip_id:
+            projection = jsonlib.Projection(projection.fields + ['id'])
+        # The windows in order, with the future fetching each one
+        # once it is among the next `concurrency` to read
+        windows = deque([[bounds, None]])
+        seen = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            try:
+                while windows:
+                    for window in islice(windows, self.concurrency):
+                        if window[1] is None:
+                            window[1] = executor.submit(
+                                self._fetch_window, endpoint, objectid, parameters, window[0], shard_size,
+                                projection)
+                    split, results = windows.popleft()[1].result()
+                    if split:
+                        # They go before any later window, keeping the order
+                        windows.extendleft([window, None] for window in reversed(split))
+                        continue
+                    for result in results:
+                        # An entry moved to another window while fetching
+                        entry_id = result.pop('id') if strip_id else result['id']
+                        if entry_id in seen:
+                            continue
+                        seen.add(entry_id)
+                        yield result
+            finally:
+                for _, future in windows:
+                    if future is not None:
+                        future.cancel()
+
+    def running_time_entries(self, user_id=None, etag=None):
+        """
+        Gets the running timesheet entries if they changed since the
+        last call, for cheap polling. Returns the ETag to pass to the
+        next call and the list of entries, or None if nothing changed.
+
+        Parameters:
+            user_id (int): only the entries of this user
+            etag (str): the ETag returned by the previous call
+        """
+        endpoint, objectid, params = self._time_entries_request(
+            is_running="true", user_id=user_id)
+        etag, first_request = self._conditional_call(
+            endpoint, self._page_parameters(params, 1), etag)
+        if first_request is None:
+            return etag, None
+        results = first_request[objectid]
+        if first_request['total_pages'] > 1:
+            results = self._get_paged_results(endpoint, objectid, params)
+        return etag, results
 
     def time_entry(self, time_entry_id):
         """
@@ -188,20 +880,7 @@ class Harvest(object):
             project_id (int): the project identifier
             task_id (int): the task identifier
         """
-        url = self.API_URL + '/time_entries/{}'.format(time_entry_id)
-        params = {
-            'project_id': project_id,
-            'task_id': task_id
-        }
-
-        if notes:
-            params['notes'] = notes
-
+        endpoint, params = self._update_time_entry_request(
+            time_entry_id, project_id, task_id, notes)
         self.logger.debug('Calling PATCH for updating the time entry')
-        r = self.session.patch(url=url, params=params)
-
-        if r.status_code == 200:
-            return r.json()
-        else:
-            self.logger.debug(r.text)
-            raise Exception('Error accessing the /time_entries endpoint')
+        return self._request('PATCH', endpoint, params)
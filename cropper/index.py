@@ -0,0 +1,70 @@
+class EntityIndex(object):
+    """
+    Loads every project, client, user and task assignment of the
+    account with one paged request per resource, the first time
+    each one is needed, and indexes them by identifier, by name and
+    by parent project. Lookups are answered from memory afterwards,
+    instead of requesting every project or task list one by one.
+    """
+
+    def __init__(self, harvest):
+        """
+        Parameters:
+            harvest (Harvest): the client to load the entities with
+        """
+        self.harvest = harvest
+        self._projects = None
+        self._projects_by_name = None
+        self._clients = None
+        self._users = None
+        self._tasks_by_project = None
+
+    def _load_projects(self):
+        if self._projects is None:
+            self._projects = {}
+            self._projects_by_name = {}
+            for project in self.harvest.iter_projects('all'):
+                self._projects[project['id']] = project
+                self._projects_by_name.setdefault(project['name'].lower(), []).append(project)
+
+    def project(self, project_id):
+        """
+        Returns a project by its identifier, None if it doesn't exist
+        """
+        self._load_projects()
+        return self._projects.get(project_id)
+
+    def projects_named(self, name):
+        """
+        Returns the list of projects with a name, ignoring case
+        """
+        self._load_projects()
+        return self._projects_by_name.get(name.lower(), [])
+
+    def client(self, client_id):
+        """
+        Returns a client by its identifier, None if it doesn't exist
+        """
+        if self._clients is None:
+            self._clients = {client['id']: client for client in self.harvest.iter_clients('all')}
+        return self._clients.get(client_id)
+
+    def user(self, user_id):
+        """
+        Returns a user by its identifier, None if it doesn't exist
+        """
+        if self._users is None:
+            self._users = {user['id']: user for user in self.harvest.iter_users('all')}
+        return self._users.get(user_id)
+
+    def task_assignments(self, project_id):
+        """
+        Returns the task assignments of a project, all of them are
+        loaded at once from the account wide endpoint
+        """
+        if self._tasks_by_project is None:
+            self._tasks_by_project = {}
+            for assignment in self.harvest.iter_task_assignments():
+                self._tasks_by_project.setdefault(
+                    assignment['project']['id'], []).append(assignment)
+        return self._tasks_by_project.get(project_id, [])
@@ -0,0 +1,88 @@
+"""
+JSON encoding and decoding with orjson when it is installed, or the
+standard library otherwise. Install it with harvest-cropper[fast].
+Both write the same compact JSON.
+"""
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+if orjson is not None:
+    BACKEND = 'orjson'
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+else:
+    BACKEND = 'json'
+
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj):
+        # Compact and without escaping, like orjson
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+class Projection(object):
+    """
+    Keeps only some fields of the API objects, nested fields are
+    given with dots, like 'task.id'. Fields an object doesn't have
+    are left out.
+    """
+
+    def __init__(self, fields):
+        """
+        Parameters:
+            fields (list or str): the field specs, or a comma
+                                  separated string of them
+        """
+        if isinstance(fields, str):
+            fields = fields.split(',')
+        self.fields = [field.strip() for field in fields if field.strip()]
+        if not self.fields:
+            raise ValueError('No fields to keep')
+        self.tree = {}
+        for field in self.fields:
+            node = self.tree
+            parts = field.split('.')
+            for part in parts[:-1]:
+                # A whole object wins over some of its fields
+                if part in node and node[part] is None:
+                    break
+                node = node.setdefault(part, {})
+            else:
+                node[parts[-1]] = None
+
+    @property
+    def headers(self):
+        """
+        The field specs using the double underscore convention of
+        the renderers
+        """
+        return [field.replace('.', '__') for field in self.fields]
+
+    def _project(self, obj, tree):
+        result = {}
+        for key, subtree in tree.items():
+            if key not in obj:
+                continue
+            value = obj[key]
+            if subtree is not None and isinstance(value, dict):
+                value = self._project(value, subtree)
+            result[key] = value
+        return result
+
+    def __call__(self, obj):
+        return self._project(obj, self.tree)
+
+    def page(self, objects):
+        """
+        Projects a whole page, so the full objects can be released
+        """
+        tree = self.tree
+        return [self._project(obj, tree) for obj in objects]
@@ -0,0 +1,185 @@
+import csv
+import os
+import threading
+from collections import namedtuple
+
+from cropper.bulk import BulkUpdater, TimeEntryUpdate
+
+MappingRule = namedtuple('MappingRule', ['to_project', 'to_task', 'note_append'])
+
+MAPPING_COLUMNS = ['from_project', 'from_task', 'to_project', 'to_task']
+
+
+def load_mapping(path):
+    """
+    Reads a CSV file with the from_project, from_task, to_project and
+    to_task columns, and optionally note_append, into a dict of
+    (from project, from task) -> MappingRule
+
+    Parameters:
+        path (str): the mapping file
+    """
+    rules = {}
+    with open(path, newline='') as mapping:
+        reader = csv.DictReader(mapping)
+        missing = [column for column in MAPPING_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError('The mapping file is missing the columns: {}'.format(', '.join(missing)))
+        for line, row in enumerate(reader, start=2):
+            try:
+                source = (int(row['from_project']), int(row['from_task']))
+                rule = MappingRule(int(row['to_project']), int(row['to_task']),
+                                   (row.get('note_append') or '').strip() or None)
+            except ValueError:
+                raise ValueError('Line {} of the mapping file has an invalid identifier'.format(line))
+            if rules.get(source, rule) != rule:
+                raise ValueError('Line {} maps project {} task {} again to a different target'.format(
+                    line, *source))
+            rules[source] = rule
+    return rules
+
+
+class Journal(object):
+    """
+    An append-only file with the time entries already migrated and
+    where to, so an interrupted migration can be run again and only
+    sends the updates that are left
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path (str): the journal file, created on the first write
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.output = None
+
+    def load(self):
+        """
+        Returns a dict of time entry id -> (project id, task id) of
+        every entry in the journal
+        """
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path) as journal:
+            for line in journal:
+                parts = line.strip().split(',')
+                # A run killed while writing can leave half a line
+                if len(parts) == 3 and all(part.isdigit() for part in parts):
+                    done[int(parts[0])] = (int(parts[1]), int(parts[2]))
+        return done
+
+    def record(self, update):
+        """
+        Appends a migrated TimeEntryUpdate, flushing it right away
+        """
+        with self.lock:
+            if self.output is None:
+                self.output = open(self.path, 'a')
+            self.output.write('{},{},{}\n'.format(
+                update.time_entry_id, update.project_id, update.task_id))
+            self.output.flush()
+
+    def close(self):
+        with self.lock:
+            if self.output is not None:
+                self.output.close()
+                self.output = None
+
+
+class Migration(object):
+    """
+    Moves the time entries of many (project, task) pairs to others
+    in a single run. Every source project is fetched once and its
+    entries are routed to their target by their task. The targets
+    are decided from the entries as they were fetched, so a rule
+    moving A to B and another moving B to C don't chain.
+    """
+
+    def __init__(self, harvest, rules, journal=None, logger=None):
+        """
+        Parameters:
+            harvest (Harvest): the client to fetch and update with
+            rules (dict): (from project, from task) -> MappingRule,
+                          as returned by load_mapping
+            journal (Journal): where the migrated entries are kept
+            logger (logging): a logger to use
+        """
+        self.harvest = harvest
+        self.rules = rules
+        self.journal = journal
+        self.logger = logger
+        self.counts = {'fetched': 0, 'matched': 0, 'in_journal': 0, 'at_target': 0}
+
+    def _route(self, entry, done):
+        """
+        Returns the TimeEntryUpdate of an entry or None if it has
+        nothing to do
+        """
+        rule = self.rules.get((entry['project']['id'], entry['task']['id']))
+        if rule is None:
+            return None
+        self.counts['matched'] += 1
+        if entry['id'] in done:
+            # Moved by a previous run, possibly to the source of another rule
+            self.counts['in_journal'] += 1
+            return None
+        if (entry['project']['id'], entry['task']['id']) == (rule.to_project, rule.to_task) \
+                and not rule.note_append:
+            self.counts['at_target'] += 1
+            return None
+
+        notes = None
+        if rule.note_append:
+            if entry['notes']:
+                notes = '{} - {}'.format(entry['notes'], rule.note_append)
+            else:
+                notes = rule.note_append
+        return TimeEntryUpdate(entry['id'], rule.to_project, rule.to_task, notes)
+
+    def updates(self, _from=None, to=None):
+        """
+        Returns the list of updates to send, fetching every source
+        project once. All of them are fetched before updating any so
+        the pages don't shift while reading them.
+
+        Parameters:
+            _from (str): only entries spent on or after this date
+            to (str): only entries spent on or before this date
+        """
+        done = self.journal.load() if self.journal else {}
+        updates = []
+        for project_id in sorted({project for project, _ in self.rules}):
+            if self.logger:
+                self.logger.info('Fetching the time entries of project {}'.format(project_id))
+            for entry in self.harvest.iter_time_entries(project_id=project_id, _from=_from, to=to):
+                self.counts['fetched'] += 1
+                update = self._route(entry, done)
+                if update:
+                    updates.append(update)
+        return updates
+
+    def run(self, updates, concurrency=4, on_result=None):
+        """
+        Sends the updates with a BulkUpdater, journaling every one
+        that succeeds. Returns its BulkResult.
+
+        Parameters:
+            updates (list): the TimeEntryUpdate objects to send
+            concurrency (int): how many updates can be in flight
+            on_result (callable): called after every update, see
+                                  BulkUpdater
+        """
+        def journal_result(update, result, error):
+            if error is None and self.journal:
+                self.journal.record(update)
+            if on_result:
+                on_result(update, result, error)
+
+        try:
+            return BulkUpdater(self.harvest, concurrency, journal_result).run(updates)
+        finally:
+            if self.journal:
+                self.journal.close()
@@ -0,0 +1,153 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+# The functions whose cumulative time makes every phase, as the end
+# of their file path and their name. Rendering includes the time
+# spent writing the rendered rows.
+PHASES = {
+    'network': [('cropper/harvest.py', '_send')],
+    'decode': [('cropper/jsonlib.py', 'loads')],
+    'encode': [('cropper/jsonlib.py', 'dumps')],
+    'render': [('cropper/render.py', 'write'), ('cropper/render.py', 'write_header')],
+    'write': [('~', "<method 'write' of '_io.TextIOWrapper' objects>"),
+              ('~', "<method 'write' of '_io.BufferedWriter' objects>"),
+              ('~', "<method 'flush' of '_io.TextIOWrapper' objects>")],
+}
+
+
+def short_path(filename):
+    """
+    Keeps the last folder and the name of a file, without the
+    folders that change between installations
+    """
+    return '/'.join(filename.replace(os.sep, '/').split('/')[-2:])
+
+
+def function_label(function):
+    """
+    Names a profiled function by its file, line and name
+    """
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return '{}:{}({})'.format(short_path(filename), line, name)
+
+
+class Profiler(object):
+    """
+    Profiles the CPU time and the memory of an execution: a cProfile
+    profile of the main thread and of the threads it starts, the
+    peak of memory allocated and where most of it was allocated,
+    and the time spent in every phase of PHASES
+    """
+
+    def __init__(self, top=25, frames=10):
+        """
+        Parameters:
+            top (int): how many functions and allocations to report
+            frames (int): frames of traceback kept per allocation
+        """
+        self.top = top
+        self.frames = frames
+        self.lock = threading.Lock()
+        self.profiles = []
+        self.stats = None
+        self.snapshot = None
+        self.peak = 0
+
+    def _profile_thread(self, frame, event, arg):
+        # Called on the first event of every new thread
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12 profiles every thread from the main one
+            return
+        with self.lock:
+            self.profiles.append(profile)
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        threading.setprofile(self._profile_thread)
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        profile = cProfile.Profile()
+        self.profiles.append(profile)
+        profile.enable()
+        return self
+
+    def stop(self):
+        self.profiles[0].disable()
+        self.wall = time.perf_counter() - self.started
+        self.cpu = time.process_time() - self.cpu_started
+        threading.setprofile(None)
+        self.peak = tracemalloc.get_traced_memory()[1]
+        self.snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)])
+        tracemalloc.stop()
+        with self.lock:
+            profiles = list(self.profiles)
+        self.stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            self.stats.add(profile)
+
+    def phases(self):
+        """
+        Returns the seconds spent in every phase, summed across
+        threads
+        """
+        seconds = dict.fromkeys(PHASES, 0.0)
+        for function, (_, _, _, cumulative, _) in self.stats.stats.items():
+            filename, _, name = function
+            filename = filename.replace(os.sep, '/')
+            for phase, functions in PHASES.items():
+                if any(filename.endswith(path) and name == wanted for path, wanted in functions):
+                    seconds[phase] += cumulative
+        return {phase: round(value, 4) for phase, value in seconds.items()}
+
+    def summary(self, command=None):
+        """
+        Returns the profile results as a dict
+        """
+        functions = sorted(self.stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        allocations = self.snapshot.statistics('lineno')[:self.top]
+        return {
+            'command': command,
+            'wall_seconds': round(self.wall, 4),
+            'cpu_seconds': round(self.cpu, 4),
+            'phases': self.phases(),
+            'memory': {
+                'peak_bytes': self.peak,
+                'top_allocations': [{
+                    'where': '{}:{}'.format(short_path(frame.filename), frame.lineno),
+                    'bytes': stat.size,
+                    'blocks': stat.count
+                } for stat in allocations for frame in stat.traceback[:1]]
+            },
+            'functions': [{
+                'function': function_label(function),
+                'calls': calls,
+                'own_seconds': round(own, 4),
+                'cumulative_seconds': round(cumulative, 4)
+            } for function, (_, calls, own, cumulative, _) in functions[:self.top]]
+        }
+
+    def dump(self, path, command=None):
+        """
+        Writes the profile results to a JSON file, one value per line
+        so two of them can be diffed, and the whole CPU profile next
+        to it with a .pstats extension, to open it with pstats,
+        snakeviz or pyprof2calltree
+        """
+        self.stats.dump_stats(path + '.pstats')
+        with open(path, 'w') as output:
+            json.dump(self.summary(command), output, indent=1)
+            output.write('\n')
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    A thread safe token bucket to keep a pace of requests
+    below a given rate
+    """
+
+    def __init__(self, rate, period):
+        """
+        Parameters:
+            rate (int): how many requests are allowed per period,
+                        this is also the size of the burst allowed
+                        when the bucket is full
+            period (float): the period length in seconds
+        """
+        self.rate = rate
+        self.period = period
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.rate, self.tokens + (now - self.updated) * self.rate / self.period)
+        self.updated = now
+
+    def _take(self):
+        """
+        Takes a token if there is one available, returning zero, or
+        returns the seconds to wait before trying again
+        """
+        with self.lock:
+            self._refill()
+            wait = self.paused_until - self.updated
+            if wait <= 0:
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return 0
+                wait = (1 - self.tokens) * self.period / self.rate
+            return wait
+
+    def acquire(self):
+        """
+        Takes a token from the bucket, blocking until one is available
+        """
+        wait = self._take()
+        while wait:
+            time.sleep(wait)
+            wait = self._take()
+
+    async def acquire_async(self):
+        """
+        Takes a token from the bucket, yielding to the event loop
+        until one is available
+        """
+        wait = self._take()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self._take()
+
+    def pause(self, seconds):
+        """
+        Stops handing tokens to every caller for a while, used when
+        the server asks us to slow down
+
+        Parameters:
+            seconds (float): how long to wait before the next token
+        """
+        with self.lock:
+            self.paused_until = max(
+                self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    def estimate(self, count):
+        """
+        Returns the seconds needed to take `count` tokens starting
+        from a full bucket
+
+        Parameters:
+            count (int): the number of tokens
+        """
+        return max(0, count - self.rate) * self.period / self.rate
@@ -0,0 +1,87 @@
+import sys
+
+
+class LookupTable(object):
+    """
+    Keeps a single small dict per user, project, task or client
+    referenced by the time entries, so thousands of entries of the
+    same project share one {'id': ..., 'name': ...} object instead
+    of holding a copy each
+    """
+
+    def __init__(self):
+        self.refs = {}
+
+    def ref(self, obj):
+        """
+        Returns the shared reference of a nested API object
+
+        Parameters:
+            obj (dict): the nested object, like entry['project']
+        """
+        if obj is None:
+            return None
+        ref = self.refs.get(obj['id'])
+        if ref is None:
+            ref = self.refs[obj['id']] = {'id': obj['id'], 'name': sys.intern(obj['name'])}
+        return ref
+
+
+class TimeEntry(object):
+    """
+    A time entry holding only the fields the commands use, with the
+    user, project, task and client as references to LookupTable
+    objects. It can be read like the API dict, entry['task']['name']
+    works, so the renderers and reports take both.
+    """
+
+    __slots__ = ('id', 'spent_date', 'hours', 'notes', 'is_running', 'billable',
+                 'user', 'project', 'task', 'client', 'account_id')
+
+    REFS = ('user', 'project', 'task', 'client')
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+class TimeEntryTable(object):
+    """
+    Turns API time entries into compact TimeEntry records sharing
+    the same lookup tables
+    """
+
+    def __init__(self):
+        self.tables = {ref: LookupTable() for ref in TimeEntry.REFS}
+
+    def compact(self, entry):
+        """
+        Returns the TimeEntry record of an API time entry
+
+        Parameters:
+            entry (dict): the time entry as returned by the API
+        """
+        record = TimeEntry()
+        record.id = entry['id']
+        record.spent_date = sys.intern(entry['spent_date'])
+        record.hours = entry['hours']
+        record.notes = entry['notes']
+        record.is_running = entry['is_running']
+        record.billable = entry.get('billable')
+        # Tagged by FanOut when querying several accounts
+        record.account_id = entry.get('account_id')
+        for ref in TimeEntry.REFS:
+            setattr(record, ref, self.tables[ref].ref(entry.get(ref)))
+        return record
+
+    def compact_all(self, entries):
+        """
+        Returns the list of TimeEntry records of an iterable of API
+        time entries, letting every dict go as soon as it is read
+        """
+        return [self.compact(entry) for entry in entries]
@@ -0,0 +1,116 @@
+import csv
+import sys
+from operator import itemgetter
+
+import click
+
+RESET = '\x1b[0m'
+
+
+def compile_accessor(spec, optional=False):
+    """
+    Compiles a field spec using the double underscore convention
+    for nested keys, like 'task__name', into a function that reads
+    that value from an object. Optional fields read None when the
+    object or any of its parents doesn't have them.
+    """
+    parts = spec.split('__')
+    if optional:
+        def optional_accessor(obj):
+            for part in parts:
+                get = getattr(obj, 'get', None)
+                if get is None:
+                    return None
+                obj = get(part)
+            return obj
+        return optional_accessor
+    if len(parts) == 1:
+        return itemgetter(parts[0])
+    elif len(parts) == 2:
+        first, second = parts
+        return lambda obj: obj[first][second]
+
+    def accessor(obj):
+        value = obj
+        for part in parts:
+            value = value[part]
+        return value
+    return accessor
+
+
+class RowRenderer(object):
+    """
+    Writes objects as CSV rows, or formatted with a template,
+    reading the fields with accessors compiled once and reusing a
+    single csv writer over a buffered stream. Colour codes are only
+    written when the stream is a terminal.
+    """
+
+    def __init__(self, headers, print_active=False, template=None, stream=None, color=None,
+                 optional=False):
+        """
+        Parameters:
+            headers (list): the field specs to write, nested keys
+                            are declared with double underscores
+            print_active (bool): paint inactive objects in yellow
+            template (str): a format string using the field specs
+                            as names, instead of writing CSV
+            stream (file): where to write, stdout by default
+            color (bool): force or disable the colour codes
+            optional (bool): write an empty value for the fields an
+                             object doesn't have, like the ones left
+                             out by a jsonlib.Projection
+        """
+        self.headers = list(headers)
+        self.print_active = print_active
+        self.template = template
+        self.stream = stream or sys.stdout
+        if color is None:
+            isatty = getattr(self.stream, 'isatty', None)
+            color = bool(isatty and isatty())
+        self.color = color
+
+        self.accessors = [compile_accessor(header, optional) for header in self.headers]
+        self.green = click.style('', fg='green', reset=False) if color else ''
+        self.yellow = click.style('', fg='yellow', reset=False) if color else ''
+        self.eol = RESET + '\n' if color else '\n'
+        self.writer = csv.writer(self.stream, lineterminator=self.eol)
+
+    def values(self, obj):
+        """
+        Returns the list of values of an object, in header order
+        """
+        values = [accessor(obj) for accessor in self.accessors]
+        for i, value in enumerate(values):
+            if type(value) is str and '\r\n' in value:
+                values[i] = value.replace('\r\n', ' ')
+        return values
+
+    def write_header(self):
+        self.stream.write(self.green + ",".join(self.headers) + self.eol)
+
+    def write(self, obj):
+        """
+        Writes a single object
+        """
+        if self.print_active and not obj['is_active']:
+            self.stream.write(self.yellow)
+        else:
+            self.stream.write(self.green)
+
+        values = self.values(obj)
+        if self.template:
+            self.stream.write(self.template.format_map(
+                dict(zip(self.headers, values))) + self.eol)
+        else:
+            self.writer.writerow(values)
+
+    def write_all(self, objs, print_headers=True):
+        """
+        Writes an iterable of objects, flushing the stream at the end
+        """
+        if print_headers:
+            self.write_header()
+        for obj in objs:
+            self.write(obj)
+        self.stream.flush()
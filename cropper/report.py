@@ -0,0 +1,199 @@
+from datetime import date, timedelta
+from itertools import islice
+
+
+def _week(spent_date):
+    day = date.fromisoformat(spent_date)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+# How to read every period key from the date an entry was spent on
+PERIODS = {
+    'day': lambda spent_date: spent_date,
+    'week': _week,
+    'month': lambda spent_date: spent_date[:7]
+}
+
+# How to read every grouping key from a time entry
+GROUPS = {
+    'user': lambda entry: entry['user']['name'],
+    'client': lambda entry: entry['client']['name'] if entry.get('client') else '',
+    'project': lambda entry: entry['project']['name'],
+    'task': lambda entry: entry['task']['name'],
+    'day': lambda entry: entry['spent_date'],
+    'week': lambda entry: _week(entry['spent_date']),
+    'month': lambda entry: entry['spent_date'][:7]
+}
+
+COLUMNS = ['hours', 'billable_hours', 'non_billable_hours', 'entries']
+
+
+class Report(object):
+    """
+    Sums the hours of time entries by any combination of user,
+    client, project, task and day, week or month, in a single pass.
+    Only the running totals of every group are kept in memory.
+    """
+
+    def __init__(self, group_by):
+        """
+        Parameters:
+            group_by (list): the keys in GROUPS to group by
+        """
+        self.group_by = list(group_by)
+        self.keys = [GROUPS[key] for key in self.group_by]
+        # group key tuple -> [hours, billable hours, entries]
+        self.groups = {}
+
+    def _key(self, entry):
+        return tuple(key(entry) for key in self.keys)
+
+    def add(self, entry):
+        """
+        Adds a time entry to the totals of its group
+        """
+        key = self._key(entry)
+        totals = self.groups.get(key)
+        if totals is None:
+            totals = self.groups[key] = [0.0, 0.0, 0]
+        hours = float(entry['hours'])
+        totals[0] += hours
+        if entry.get('billable'):
+            totals[1] += hours
+        totals[2] += 1
+
+    def add_all(self, entries):
+        """
+        Consumes an iterable of time entries
+        """
+        for entry in entries:
+            self.add(entry)
+        return self
+
+    def rows(self):
+        """
+        Returns a list of dicts, one per group sorted by its keys,
+        with the group keys and the COLUMNS totals
+        """
+        rows = []
+        for key in sorted(self.groups):
+            hours, billable, entries = self.groups[key]
+            row = dict(zip(self.group_by, key))
+            row.update({
+                'hours': round(hours, 2),
+                'billable_hours': round(billable, 2),
+                'non_billable_hours': round(hours - billable, 2),
+                'entries': entries
+            })
+            rows.append(row)
+        return rows
+
+    def total(self):
+        """
+        Returns a dict with the COLUMNS totals of all the groups
+        """
+        hours = sum(totals[0] for totals in self.groups.values())
+        billable = sum(totals[1] for totals in self.groups.values())
+        return {
+            'hours': round(hours, 2),
+            'billable_hours': round(billable, 2),
+            'non_billable_hours': round(hours - billable, 2),
+            'entries': sum(totals[2] for totals in self.groups.values())
+        }
+
+
+class NumpyReport(Report):
+    """
+    A Report that sums the entries in chunks with NumPy, for ranges
+    of millions of entries. Every key is read as a column of the
+    chunk and numbered with numpy.unique, the users, clients,
+    projects and tasks by id and the periods by day, so names,
+    weeks and months are only worked out once per distinct value,
+    and the hours are summed by group with numpy.bincount. Memory
+    still grows with the number of groups and the chunk size only.
+    """
+
+    def __init__(self, group_by, chunk_size=10000):
+        """
+        Parameters:
+            group_by (list): the keys in GROUPS to group by
+            chunk_size (int): how many entries to sum at once
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('The numpy engine needs numpy, install harvest-cropper[numpy]')
+        self.numpy = numpy
+        super().__init__(group_by)
+        self.chunk_size = chunk_size
+        self.chunk = []
+
+    def add(self, entry):
+        self.chunk.append(entry)
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def _factorize(self, key, chunk, days):
+        """
+        Returns the distinct values of a key in a chunk and the index
+        of the value of every entry among them
+        """
+        numpy = self.numpy
+        if key in PERIODS:
+            if not days:
+                days.extend(numpy.unique([entry['spent_date'] for entry in chunk], return_inverse=True))
+            period = PERIODS[key]
+            return [period(day) for day in days[0].tolist()], days[1]
+        if key == 'client':
+            ids = [entry['client']['id'] if entry.get('client') else 0 for entry in chunk]
+        else:
+            ids = [entry[key]['id'] for entry in chunk]
+        ids = numpy.fromiter(ids, numpy.int64, len(chunk))
+        _, first, inverse = numpy.unique(ids, return_index=True, return_inverse=True)
+        read = GROUPS[key]
+        return [read(chunk[i]) for i in first.tolist()], inverse
+
+    def flush(self):
+        """
+        Reduces the pending chunk into the group totals
+        """
+        chunk, self.chunk = self.chunk, []
+        if not chunk:
+            return
+        numpy = self.numpy
+        size = len(chunk)
+        hours = numpy.fromiter([entry['hours'] for entry in chunk], numpy.float64, size)
+        billable = numpy.fromiter([bool(entry.get('billable')) for entry in chunk], bool, size)
+
+        days = []
+        keys = [self._factorize(key, chunk, days) for key in self.group_by]
+        codes = numpy.zeros(size, dtype=numpy.int64)
+        for values, inverse in keys:
+            # Numbered again after every key so the codes stay below
+            # the chunk size whatever the number of keys
+            _, first, codes = numpy.unique(
+                codes * len(values) + inverse, return_index=True, return_inverse=True)
+        sums = numpy.bincount(codes, weights=hours).tolist()
+        billable_sums = numpy.bincount(codes, weights=numpy.where(billable, hours, 0)).tolist()
+        counts = numpy.bincount(codes).tolist()
+
+        # The values of every group, read from its first entry
+        columns = [[values[index] for index in inverse[first].tolist()] for values, inverse in keys]
+        for key, group_hours, group_billable, group_count in zip(zip(*columns), sums, billable_sums, counts):
+            totals = self.groups.get(key)
+            if totals is None:
+                totals = self.groups[key] = [0.0, 0.0, 0]
+            totals[0] += group_hours
+            totals[1] += group_billable
+            totals[2] += group_count
+
+    def add_all(self, entries):
+        # Read in chunks instead of calling add for every entry
+        entries = iter(entries)
+        while True:
+            self.chunk.extend(islice(entries, self.chunk_size - len(self.chunk)))
+            if len(self.chunk) < self.chunk_size:
+                break
+            self.flush()
+        self.flush()
+        return self
@@ -0,0 +1,218 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+
+# What a Harvest client reports to its hooks after every HTTP request,
+# failed attempts included. status is None when the server could not
+# be reached and page is None when the endpoint is not paged.
+RequestRecord = namedtuple('RequestRecord', [
+    'method', 'endpoint', 'status', 'latency', 'bytes', 'page', 'retries', 'started'])
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def endpoint_label(endpoint):
+    """
+    Groups the endpoints of single records, /projects/123 is
+    reported as /projects/{id}
+    """
+    return '/' + re.sub(r'/\d+', '/{id}', endpoint.strip('/'))
+
+
+def quantile(values, q):
+    """
+    The nearest rank quantile of a sorted list
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def busy_time(intervals):
+    """
+    Seconds covered by a list of (start, end) intervals, counting
+    only once the time of the requests sent in parallel
+    """
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+class StatsCollector(object):
+    """
+    A request hook for Harvest that keeps the records of every
+    request, and the time the output spent waiting for them, to
+    summarise where the time of an execution went
+    """
+
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.output_time = 0.0
+        self.waiting_time = 0.0
+
+    def __call__(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def timed(self, iterable):
+        """
+        Wraps the iterable an output is written from, to tell the
+        time spent waiting for the next object from the time spent
+        writing it
+        """
+        iterator = iter(iterable)
+        start = time.perf_counter()
+        try:
+            while True:
+                waiting = time.perf_counter()
+                try:
+                    obj = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.waiting_time += time.perf_counter() - waiting
+                yield obj
+        finally:
+            self.output_time += time.perf_counter() - start
+
+    def summary(self):
+        """
+        Returns a dict with the totals of the execution so far
+        """
+        with self.lock:
+            records = list(self.records)
+        latencies = sorted(record.latency for record in records)
+        statuses = {}
+        endpoints = {}
+        for record in records:
+            status = str(record.status or 'error')
+            statuses[status] = statuses.get(status, 0) + 1
+            label = endpoint_label(record.endpoint)
+            totals = endpoints.setdefault(label, {'requests': 0, 'seconds': 0.0, 'bytes': 0})
+            totals['requests'] += 1
+            totals['seconds'] += record.latency
+            totals['bytes'] += record.bytes
+
+        return {
+            'elapsed': time.perf_counter() - self.started,
+            'requests': len(records),
+            'retries': sum(1 for record in records if record.retries),
+            'pages': sum(1 for record in records if record.page and record.status == 200),
+            'bytes': sum(record.bytes for record in records),
+            'statuses': statuses,
+            'latency': {str(q): quantile(latencies, q) for q in QUANTILES},
+            'network_time': busy_time([(record.started, record.started + record.latency)
+                                       for record in records]),
+            'render_time': max(0.0, self.output_time - self.waiting_time),
+            'endpoints': endpoints
+        }
+
+    def format_summary(self):
+        """
+        Returns the summary as a human readable table
+        """
+        summary = self.summary()
+        latency = summary['latency']
+        lines = [
+            'requests      {} ({} retried, {} pages)'.format(
+                summary['requests'], summary['retries'], summary['pages']),
+            'statuses      {}'.format(', '.join(
+                '{}: {}'.format(status, count) for status, count in sorted(summary['statuses'].items()))),
+            'latency       p50 {:.0f} ms, p95 {:.0f} ms, p99 {:.0f} ms'.format(
+                latency['0.5'] * 1000, latency['0.95'] * 1000, latency['0.99'] * 1000),
+            'transferred   {:.2f} MB'.format(summary['bytes'] / 1e6),
+            'network       {:.2f} s'.format(summary['network_time']),
+            'rendering     {:.2f} s'.format(summary['render_time']),
+            'elapsed       {:.2f} s'.format(summary['elapsed'])
+        ]
+        if summary['endpoints']:
+            width = max(len(label) for label in summary['endpoints'])
+            lines.append('')
+            lines.append('{}  {:>8}  {:>10}  {:>10}'.format('endpoint'.ljust(width), 'requests', 'seconds', 'MB'))
+            for label, totals in sorted(summary['endpoints'].items()):
+                lines.append('{}  {:>8}  {:>10.2f}  {:>10.2f}'.format(
+                    label.ljust(width), totals['requests'], totals['seconds'], totals['bytes'] / 1e6))
+        return '\n'.join(lines)
+
+    def prometheus(self, command=None):
+        """
+        Returns the summary in the Prometheus text format, to be
+        picked by the node exporter textfile collector
+
+        Parameters:
+            command (str): the command name to add as a label
+        """
+        summary = self.summary()
+        base = ['command="{}"'.format(command)] if command else []
+        lines = []
+
+        def family(name, help, samples):
+            """
+            Adds a metric with its samples, a list of (labels, value)
+            """
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} gauge'.format(name))
+            for labels, value in samples:
+                tags = ','.join(base + labels)
+                lines.append('{}{} {}'.format(name, '{' + tags + '}' if tags else '', value))
+
+        family('cropper_last_run_timestamp_seconds', 'When the execution finished',
+               [([], int(time.time()))])
+        family('cropper_run_seconds', 'Wall time of the execution',
+               [([], round(summary['elapsed'], 6))])
+        family('cropper_network_seconds', 'Time with at least one request in flight',
+               [([], round(summary['network_time'], 6))])
+        family('cropper_render_seconds', 'Time spent writing the output',
+               [([], round(summary['render_time'], 6))])
+        family('cropper_request_retries', 'Requests that were a retry of a failed one',
+               [([], summary['retries'])])
+        family('cropper_request_latency_seconds', 'Latency quantiles of the API requests',
+               [(['quantile="{}"'.format(q)], round(value, 6))
+                for q, value in sorted(summary['latency'].items())])
+        family('cropper_requests', 'API requests sent',
+               [(['endpoint="{}"'.format(label)], totals['requests'])
+                for label, totals in sorted(summary['endpoints'].items())])
+        family('cropper_response_bytes', 'Bytes of the API responses as transferred, compressed or not',
+               [(['endpoint="{}"'.format(label)], totals['bytes'])
+                for label, totals in sorted(summary['endpoints'].items())])
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path, command=None):
+        """
+        Writes the summary to a file, in the Prometheus text format
+        if its name ends with .prom or as JSON otherwise. The file is
+        replaced atomically so collectors never read half of it.
+
+        Parameters:
+            path (str): the file to write
+            command (str): the command name, to tell executions apart
+        """
+        if path.endswith('.prom'):
+            content = self.prometheus(command)
+        else:
+            summary = self.summary()
+            summary['command'] = command
+            summary['timestamp'] = time.time()
+            content = json.dumps(summary, indent=2)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as output:
+            output.write(content)
+        os.replace(tmp, path)
+
+    def print_summary(self, stream=None):
+        (stream or sys.stderr).write(self.format_summary() + '\n')
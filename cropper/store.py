@@ -0,0 +1,331 @@
+import os
+import sqlite3
+import threading
+import time
+
+from cropper import jsonlib
+
+
+def user_data_dir():
+    """
+    Returns the folder where cropper keeps its data files,
+    following the XDG base directory convention
+    """
+    base = os.environ.get('XDG_DATA_HOME') or os.path.join(
+        os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'cropper')
+
+
+class LocalStore(object):
+    """
+    A SQLite mirror of the time entries, projects, users and clients
+    of a Harvest account, kept up to date by Synchronizer
+    """
+
+    RESOURCES = ('clients', 'users', 'projects', 'time_entries')
+
+    def __init__(self, accountid, path=None):
+        """
+        Parameters:
+            accountid (str): the mirrored Harvest account
+            path (str): the SQLite database file, by default it is
+                        stored at the user data folder
+        """
+        self.path = path or os.path.join(
+            user_data_dir(), 'mirror-{}.sqlite'.format(accountid))
+        self.lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False)
+            with self._connection:
+                self._connection.executescript('''
+                    CREATE TABLE IF NOT EXISTS entities (
+                        resource TEXT NOT NULL,
+                        id INTEGER NOT NULL,
+                        updated_at TEXT,
+                        data TEXT NOT NULL,
+                        PRIMARY KEY (resource, id)
+                    );
+                    CREATE TABLE IF NOT EXISTS time_entries (
+                        id INTEGER PRIMARY KEY,
+                        updated_at TEXT,
+                        spent_date TEXT,
+                        user_id INTEGER,
+                        client_id INTEGER,
+                        project_id INTEGER,
+                        task_id INTEGER,
+                        is_running INTEGER,
+                        is_billed INTEGER,
+                        data TEXT NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS time_entries_project
+                        ON time_entries (project_id, spent_date);
+                    CREATE INDEX IF NOT EXISTS time_entries_user
+                        ON time_entries (user_id, spent_date);
+                    CREATE INDEX IF NOT EXISTS time_entries_date
+                        ON time_entries (spent_date);
+                    CREATE TABLE IF NOT EXISTS sync_state (
+                        resource TEXT PRIMARY KEY,
+                        high_water TEXT,
+                        synced_at REAL,
+                        reconciled_at REAL
+                    );''')
+        return self._connection
+
+    def state(self, resource):
+        """
+        Returns a dict with the high water mark (the updated_since of
+        the next incremental sync), the last sync time and the last
+        reconciliation time of a resource
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT high_water, synced_at, reconciled_at FROM sync_state WHERE resource = ?',
+                (resource,)).fetchone()
+        high_water, synced_at, reconciled_at = row or (None, None, None)
+        return {
+            'high_water': high_water,
+            'synced_at': synced_at,
+            'reconciled_at': reconciled_at
+        }
+
+    def _rows(self, resource, records):
+        for record in records:
+            data = jsonlib.dumps(record)
+            if resource == 'time_entries':
+                yield (record['id'], record['updated_at'], record['spent_date'],
+                       record['user']['id'],
+                       record['client']['id'] if record.get('client') else None,
+                       record['project']['id'], record['task']['id'],
+                       record.get('is_running'), record.get('is_billed'), data)
+            else:
+                yield (resource, record['id'], record['updated_at'], data)
+
+    def upsert(self, resource, records):
+        """
+        Stores a batch of records of a resource replacing the
+        previous version
+        """
+        rows = list(self._rows(resource, records))
+        if not rows:
+            return
+        if resource == 'time_entries':
+            sql = 'INSERT OR REPLACE INTO time_entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+        else:
+            sql = 'INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?)'
+        with self.lock, self.connection:
+            self.connection.executemany(sql, rows)
+
+    def update_state(self, resource, high_water, reconciled=False):
+        """
+        Records a finished sync of a resource
+
+        Parameters:
+            resource (str): the synced resource
+            high_water (str): the updated_since of the next sync
+            reconciled (bool): whether it was a full pass
+        """
+        now = time.time()
+        current = self.state(resource)
+        reconciled_at = now if reconciled else current['reconciled_at']
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)',
+                (resource, high_water, now, reconciled_at))
+
+    def delete_missing(self, resource, ids):
+        """
+        Removes the records of a resource whose identifiers are not
+        in `ids`, returning how many were removed
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY)')
+            self.connection.execute('DELETE FROM seen')
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO seen VALUES (?)', ((i,) for i in ids))
+            if resource == 'time_entries':
+                cursor = self.connection.execute(
+                    'DELETE FROM time_entries WHERE id NOT IN (SELECT id FROM seen)')
+            else:
+                cursor = self.connection.execute(
+                    'DELETE FROM entities WHERE resource = ? AND id NOT IN (SELECT id FROM seen)',
+                    (resource,))
+            return cursor.rowcount
+
+    def iter_entities(self, resource, active='all', updated_since=None):
+        """
+        Iterates over the stored records of projects, users or clients
+
+        Parameters:
+            resource (str): projects, users or clients
+            active (str): all, active or inactive records
+            updated_since (str): only the records updated since
+                                 this ISO 8601 date time
+        """
+        sql = 'SELECT data FROM entities WHERE resource = ?'
+        values = [resource]
+        if updated_since:
+            sql += ' AND updated_at >= ?'
+            values.append(updated_since)
+        with self.lock:
+            rows = self.connection.execute(sql + ' ORDER BY id', values).fetchall()
+        for (data,) in rows:
+            record = jsonlib.loads(data)
+            if active == 'all' or record.get('is_active') == (active == 'active'):
+                yield record
+
+    def iter_projects(self, active, client=None, updated_since=None):
+        """
+        Iterates over the stored projects, accepting the same
+        filters as Harvest.iter_projects
+        """
+        projects = self.iter_entities('projects', active, updated_since)
+        if not client:
+            return projects
+        return (project for project in projects
+                if project.get('client') and str(project['client']['id']) == str(client))
+
+    def iter_clients(self, active="all", updated_since=None):
+        """
+        Iterates over the stored clients, see Harvest.iter_clients
+        """
+        return self.iter_entities('clients', active, updated_since)
+
+    def iter_users(self, active="all", updated_since=None):
+        """
+        Iterates over the stored users, see Harvest.iter_users
+        """
+        return self.iter_entities('users', active, updated_since)
+
+    def iter_time_entries(self, **kwargs):
+        """
+        Iterates over the stored time entries, accepting the same
+        filters as Harvest.iter_time_entries
+        """
+        columns = {
+            'user_id': 'user_id = ?',
+            'client_id': 'client_id = ?',
+            'project_id': 'project_id = ?',
+            'task_id': 'task_id = ?',
+            '_from': 'spent_date >= ?',
+            'to': 'spent_date <= ?',
+            'updated_since': 'updated_at >= ?'
+        }
+        conditions = []
+        values = []
+        for key, value in kwargs.items():
+            if not value:
+                continue
+            if key in ('is_running', 'is_billed'):
+                conditions.append('{} = ?'.format(key))
+                values.append(1 if str(value).lower() == 'true' else 0)
+            elif key in columns:
+                conditions.append(columns[key])
+                values.append(value)
+            else:
+                raise ValueError('Unknown time entries filter {}'.format(key))
+
+        sql = 'SELECT data FROM time_entries'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        # Same order as the API, newest first
+        sql += ' ORDER BY spent_date DESC, id DESC'
+        with self.lock:
+            rows = self.connection.execute(sql, values).fetchall()
+        for (data,) in rows:
+            yield jsonlib.loads(data)
+
+
+class Synchronizer(object):
+    """
+    Keeps a LocalStore in sync with a Harvest account, fetching only
+    the records updated since the previous run
+    """
+
+    # Days between full reconciliation passes to drop deleted records
+    RECONCILE_EVERY = 7
+
+    # Seconds before the start of a sync the next one asks for the
+    # records updated since, for clock skew and slow writes
+    SAFETY_MARGIN = 300
+
+    def __init__(self, harvest, store, logger):
+        """
+        Parameters:
+            harvest (Harvest): the client to fetch the records with
+            store (LocalStore): the mirror to update
+            logger (logging): a logger to use
+        """
+        self.harvest = harvest
+        self.store = store
+        self.logger = logger
+
+    def _fetch(self, resource, updated_since=None):
+        if resource == 'time_entries':
+            return self.harvest.iter_time_entries(updated_since=updated_since)
+        fetch = getattr(self.harvest, 'iter_{}'.format(resource))
+        return fetch('all', updated_since=updated_since)
+
+    def _needs_reconcile(self, state, reconcile_every):
+        if state['reconciled_at'] is None:
+            return True
+        return time.time() - state['reconciled_at'] > reconcile_every * 86400
+
+    def sync(self, resources=LocalStore.RESOURCES, reconcile=False,
+             reconcile_every=RECONCILE_EVERY, batch_size=500):
+        """
+        Brings the mirror up to date, returning a dict with the
+        number of records stored and deleted for each resource
+
+        Parameters:
+            resources (tuple): which resources to sync
+            reconcile (bool): force a full pass to drop deleted records
+            reconcile_every (int): days after which the full pass is
+                                   run even if not forced
+            batch_size (int): records to write on every transaction
+        """
+        summary = {}
+        # Full passes delete what they don't see, so every record has
+        # to come from the API and not from a cached or memoized page
+        cache, memo = self.harvest.cache, self.harvest.memo
+        self.harvest.cache = self.harvest.memo = None
+        try:
+            for resource in resources:
+                state = self.store.state(resource)
+                full = reconcile or self._needs_reconcile(state, reconcile_every)
+                since = None if full else state['high_water']
+                self.logger.info('Syncing {} {}'.format(
+                    resource, 'since {}'.format(since) if since else 'from scratch'))
+
+                # Not the latest updated_at fetched, a record edited
+                # during the sync can be older than that and missed
+                high_water = time.strftime(
+                    '%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - self.SAFETY_MARGIN))
+                seen = set() if full else None
+                stored = 0
+                batch = []
+
+                for record in self._fetch(resource, since):
+                    if seen is not None:
+                        seen.add(record['id'])
+                    batch.append(record)
+                    stored += 1
+                    if len(batch) >= batch_size:
+                        self.store.upsert(resource, batch)
+                        batch.clear()
+                self.store.upsert(resource, batch)
+
+                deleted = self.store.delete_missing(resource, seen) if full else 0
+                self.store.update_state(resource, high_water, reconciled=full)
+                summary[resource] = {'stored': stored, 'deleted': deleted}
+        finally:
+            self.harvest.cache, self.harvest.memo = cache, memo
+        return summary
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from cropper.exceptions import HarvestConnectionError
+
+
+class HTTPTransport(object):
+    """
+    Sends the requests of a Harvest client over a pool of keep-alive
+    connections. Every request has a connect and read timeout, so a
+    stalled connection fails and is retried instead of hanging.
+
+    A transport is anything with a request method like this one
+    returning a requests.Response, and a close method, and may have
+    a grow_pool method.
+    """
+
+    def __init__(self, headers=None, pool_size=10, keep_alive=True, connect_timeout=10,
+                 read_timeout=60, gzip=True):
+        """
+        Parameters:
+            headers (dict): headers to send on every request
+            pool_size (int): connections kept open per host
+            keep_alive (bool): reuse the connections between requests
+            connect_timeout (float): seconds to wait for a connection
+            read_timeout (float): seconds to wait for the server
+                                  between bytes of the response
+            gzip (bool): ask for compressed responses
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.pool_size = None
+        self.grow_pool(pool_size)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate' if gzip else 'identity'
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+        self.session.headers.update(headers or {})
+
+    def grow_pool(self, pool_size):
+        """
+        Keeps at least this many connections open per host, for
+        callers sending that many requests at once
+
+        Parameters:
+            pool_size (int): connections kept open per host
+        """
+        if self.pool_size is not None and pool_size <= self.pool_size:
+            return
+        previous = self.session.adapters.get('https://')
+        # Harvest retries the failed requests itself
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if self.pool_size is not None:
+            previous.close()
+        self.pool_size = pool_size
+
+    def request(self, method, url, params=None, headers=None):
+        return self.session.request(
+            method, url=url, params=params, headers=headers, timeout=self.timeout)
+
+    def close(self):
+        self.session.close()
+
+
+def request_key(method, url, params=None):
+    """
+    Names the file of a recorded response after the request
+    """
+    query = urlencode(sorted((params or {}).items()))
+    digest = hashlib.sha1('{} {}?{}'.format(method, url, query).encode('utf-8')).hexdigest()
+    return '{}-{}.json'.format(method.lower(), digest[:20])
+
+
+class RecordingTransport(object):
+    """
+    Sends the requests through another transport and saves every
+    response in a directory, to be served later by ReplayTransport
+    """
+
+    def __init__(self, transport, directory):
+        """
+        Parameters:
+            transport: the transport actually sending the requests
+            directory (str): where to save the responses
+        """
+        self.transport = transport
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def request(self, method, url, params=None, headers=None):
+        r = self.transport.request(method, url, params, headers)
+        if r.status_code == 200:
+            record = {
+                'method': method,
+                'url': url,
+                'params': params or {},
+                'status': r.status_code,
+                'headers': {key: value for key, value in r.headers.items()
+                            if key.lower() in ('content-type', 'etag', 'last-modified')},
+                'body': r.text
+            }
+            path = os.path.join(self.directory, request_key(method, url, params))
+            with open(path, 'w') as output:
+                json.dump(record, output)
+        return r
+
+    def grow_pool(self, pool_size):
+        grow_pool = getattr(self.transport, 'grow_pool', None)
+        if grow_pool:
+            grow_pool(pool_size)
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayTransport(object):
+    """
+    Serves the responses saved by RecordingTransport without any
+    network access. Requests that were never recorded fail.
+    """
+
+    def __init__(self, directory):
+        """
+        Parameters:
+            directory (str): where the responses were saved
+        """
+        if not os.path.isdir(directory):
+            raise HarvestConnectionError('There are no recorded responses at {}'.format(directory))
+        if not os.access(directory, os.R_OK | os.X_OK):
+            raise HarvestConnectionError('The recorded responses at {} can not be read'.format(directory))
+        self.directory = directory
+
+    def request(self, method, url, params=None, headers=None):
+        path = os.path.join(self.directory, request_key(method, url, params))
+        try:
+            with open(path) as recorded:
+                record = json.load(recorded)
+        except FileNotFoundError:
+            raise HarvestConnectionError('There is no recorded response for {} {} with parameters: {}'.format(
+                method, url, params or {}))
+
+        r = requests.Response()
+        r.status_code = record['status']
+        r.headers = CaseInsensitiveDict(record['headers'])
+        r.url = url
+        r.encoding = 'utf-8'
+        r._content = record['body'].encode('utf-8')
+        return r
+
+    def close(self):
+        pass
@@ -0,0 +1,110 @@
+import os
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from cropper import jsonlib
+
+
+def _summary(entry):
+    return {
+        'id': entry['id'],
+        'project': entry['project'],
+        'task': entry['task'],
+        'notes': entry['notes'],
+        'hours': entry['hours'],
+        'spent_date': entry['spent_date']
+    }
+
+
+class TimerWatcher(object):
+    """
+    Polls the running timers of a Harvest account and turns their
+    changes into events: a timer was started, stopped or switched
+    to another entry, project or task.
+    """
+
+    def __init__(self, harvest, user_id=None):
+        """
+        Parameters:
+            harvest (Harvest): the client to poll with
+            user_id (int): only watch the timers of this user
+        """
+        self.harvest = harvest
+        self.user_id = user_id
+        self.etag = None
+        # user id -> running entry, None until the first poll
+        self.running = None
+
+    def _event(self, name, user, entry=None, previous=None):
+        event = {
+            'event': name,
+            'at': datetime.now(timezone.utc).isoformat(),
+            'user': user
+        }
+        if entry:
+            event['entry'] = _summary(entry)
+        if previous:
+            event['previous'] = _summary(previous)
+        return event
+
+    def poll(self):
+        """
+        Returns the list of events since the previous poll, the first
+        poll reports every timer already running with a 'running' event
+        """
+        self.etag, entries = self.harvest.running_time_entries(
+            self.user_id, self.etag)
+        if entries is None:
+            return []
+
+        current = {entry['user']['id']: entry for entry in entries}
+        events = []
+        if self.running is None:
+            events = [self._event('running', entry['user'], entry)
+                      for entry in current.values()]
+        else:
+            for user_id, entry in current.items():
+                previous = self.running.get(user_id)
+                if previous is None:
+                    events.append(self._event('started', entry['user'], entry))
+                elif (previous['id'] != entry['id'] or
+                      previous['project']['id'] != entry['project']['id'] or
+                      previous['task']['id'] != entry['task']['id']):
+                    events.append(self._event('switched', entry['user'], entry, previous))
+            for user_id, previous in self.running.items():
+                if user_id not in current:
+                    events.append(self._event('stopped', previous['user'], previous=previous))
+        self.running = current
+        return events
+
+    def watch(self, interval, emit, logger):
+        """
+        Polls forever, calling emit with every event
+
+        Parameters:
+            interval (float): seconds between polls
+            emit (callable): receives every event dict
+            logger (logging): a logger to use
+        """
+        while True:
+            start = time.monotonic()
+            try:
+                for event in self.poll():
+                    emit(event)
+            except Exception as e:
+                # Keep watching, the next poll may work
+                logger.error('Error polling the running timers: {}'.format(e))
+            time.sleep(max(0, interval - (time.monotonic() - start)))
+
+
+def run_hook(command, event, logger):
+    """
+    Runs a shell command for an event, passing the event as JSON
+    on its standard input and its name in CROPPER_EVENT
+    """
+    result = subprocess.run(
+        command, shell=True, input=jsonlib.dumps(event).encode('utf-8'),
+        env={**os.environ, 'CROPPER_EVENT': event['event']})
+    if result.returncode:
+        logger.warning('The hook exited with status {}'.format(result.returncode))
@@ -27,6 +27,12 @@ setup(name="harvest-cropper",
           "requests==2.21.0",
           "Click==7.0"
       ],
+      extras_require={
+          "async": ["aiohttp>=3.5"],
+          "numpy": ["numpy"],
+          "fast": ["orjson"],
+          "arrow": ["pyarrow>=4.0"]
+      },
       packages=find_packages(),
       include_package_data=True,
       entry_points='''
@@ -0,0 +1,48 @@
+import asyncio
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from cropper.aioharvest import AsyncHarvest
+
+
+class Handler(BaseHTTPRequestHandler):
+    received = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.received.append((self.headers.get('Authorization'), self.headers.get('Harvest-Account-ID')))
+        body = json.dumps({'id': 1}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    Handler.received = []
+    yield 'http://127.0.0.1:{}/'.format(httpd.server_port)
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_external_session_sends_the_auth_headers(server):
+    async def check():
+        async with aiohttp.ClientSession() as session:
+            harvest = AsyncHarvest(logging.getLogger(__name__), 'secret', 123, session=session, api_url=server)
+            return await harvest.check()
+
+    assert asyncio.run(check()) == {'id': 1}
+    assert Handler.received == [('Bearer secret', '123')]
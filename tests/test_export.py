@@ -0,0 +1,27 @@
+import csv
+import gzip
+
+from cropper.export import CSVWriter, ChunkedExport
+
+
+CLIENTS = [
+    {'id': 1, 'name': 'Acme', 'is_active': True, 'currency': 'EUR'},
+    {'id': 2, 'name': 'Initech', 'is_active': False, 'currency': 'USD'},
+    {'id': 3, 'name': 'Hooli', 'is_active': None, 'currency': 'USD'},
+]
+
+
+def test_csv_writes_bool_columns_as_lowercase_literals(tmp_path):
+    path = str(tmp_path / 'clients.csv')
+    rows = ChunkedExport(CSVWriter(path, compress=False), ['id', 'name', 'is_active'], chunk_size=2).write_all(CLIENTS)
+    assert rows == 3
+    with open(path, newline='') as exported:
+        assert list(csv.reader(exported)) == [
+            ['id', 'name', 'is_active'], ['1', 'Acme', 'true'], ['2', 'Initech', 'false'], ['3', 'Hooli', '']]
+
+
+def test_gzip_csv_writes_bool_columns_as_lowercase_literals(tmp_path):
+    path = str(tmp_path / 'clients.csv.gz')
+    ChunkedExport(CSVWriter(path), ['name', 'is_active']).write_all(CLIENTS)
+    with gzip.open(path, 'rt', newline='') as exported:
+        assert [row[1] for row in csv.reader(exported)] == ['is_active', 'true', 'false', '']
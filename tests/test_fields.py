@@ -0,0 +1,33 @@
+import io
+
+from cropper.jsonlib import Projection
+from cropper.render import RowRenderer
+
+
+ENTRIES = [
+    {'id': 1, 'hours': 1.5, 'invoice': {'id': 10, 'number': '2019-1'}, 'client': {'id': 3, 'name': 'Acme'}},
+    # Entries not invoiced yet have a null invoice
+    {'id': 2, 'hours': 2.0, 'invoice': None, 'client': {'id': 3, 'name': 'Acme'}},
+]
+
+
+def render(projection, objects):
+    stream = io.StringIO()
+    RowRenderer(projection.headers, stream=stream, color=False, optional=True).write_all(objects)
+    return stream.getvalue().splitlines()
+
+
+def test_projection_keeps_null_nested_objects():
+    projection = Projection('id,invoice.id')
+    assert projection.page(ENTRIES) == [{'id': 1, 'invoice': {'id': 10}}, {'id': 2, 'invoice': None}]
+
+
+def test_text_fills_fields_under_a_null_object():
+    projection = Projection('id,invoice.id,client.name')
+    assert render(projection, projection.page(ENTRIES)) == [
+        'id,invoice__id,client__name', '1,10,Acme', '2,,Acme']
+
+
+def test_text_fills_missing_fields():
+    projection = Projection('id,nope,hours.x')
+    assert render(projection, projection.page(ENTRIES)) == ['id,nope,hours__x', '1,,', '2,,']
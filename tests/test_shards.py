@@ -0,0 +1,64 @@
+import json
+import logging
+from datetime import date, timedelta
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from cropper.harvest import Harvest
+from cropper.jsonlib import Projection
+
+
+ENTRIES = [{'id': i, 'spent_date': (date(2019, 1, 1) + timedelta(days=i % 10)).isoformat(), 'hours': 1.0}
+           for i in range(1, 31)]
+
+# Moves between windows while they are fetched, so every window has it
+MOVING = {'id': 99, 'spent_date': '2019-01-05', 'hours': 2.0}
+
+
+class FakeTransport(object):
+    """
+    Answers /time_entries with ENTRIES filtered by date and paged,
+    newest first as Harvest does
+    """
+
+    def request(self, method, url, params=None, headers=None):
+        params = params or {}
+        entries = [entry for entry in ENTRIES
+                   if params.get('from', '') <= entry['spent_date'] <= params.get('to', '9999')]
+        entries.append(MOVING)
+        entries.sort(key=lambda entry: (entry['spent_date'], entry['id']), reverse=True)
+        per_page, page = params['per_page'], params['page']
+        body = {
+            'time_entries': entries[(page - 1) * per_page:page * per_page],
+            'total_entries': len(entries),
+            'total_pages': max(1, -(-len(entries) // per_page))
+        }
+        r = requests.Response()
+        r.status_code = 200
+        r.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        r.url = url
+        r._content = json.dumps(body).encode('utf-8')
+        return r
+
+    def close(self):
+        pass
+
+
+def sharded(fields):
+    harvest = Harvest(logging.getLogger(__name__), 'token', '1', concurrency=2,
+                      rate_limit=1000, transport=FakeTransport())
+    harvest.PER_PAGE = 5
+    harvest.projection = Projection(fields)
+    return list(harvest.iter_time_entries(shard_size=10))
+
+
+def test_shards_merge_entries_by_id():
+    results = sharded('id,hours')
+    assert sorted(result['id'] for result in results) == list(range(1, 31)) + [99]
+
+
+def test_shards_merge_entries_without_projected_id():
+    results = sharded('spent_date,hours')
+    assert len(results) == 31
+    assert all(list(result) == ['spent_date', 'hours'] for result in results)
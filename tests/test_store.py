@@ -0,0 +1,49 @@
+import logging
+import time
+
+from cropper.store import LocalStore, Synchronizer
+
+
+def timestamp(seconds_ago):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - seconds_ago))
+
+
+def entry(i, updated_at, notes=''):
+    return {'id': i, 'updated_at': updated_at, 'spent_date': '2019-01-01', 'notes': notes,
+            'user': {'id': 1}, 'client': None, 'project': {'id': 2}, 'task': {'id': 3}}
+
+
+class FakeHarvest(object):
+    """
+    Serves the time entries by updated_since, editing the first one
+    while the sync reads the second
+    """
+
+    def __init__(self):
+        self.cache = self.memo = None
+        self.entries = {1: entry(1, timestamp(600)), 2: entry(2, timestamp(60))}
+        self.edit = True
+
+    def iter_time_entries(self, updated_since=None):
+        for i in sorted(self.entries):
+            current = self.entries[i]
+            if updated_since and current['updated_at'] < updated_since:
+                continue
+            if i == 2 and self.edit:
+                # Saved before the entry read last, but after the sync started
+                self.entries[1] = entry(1, timestamp(120), 'edited')
+                self.edit = False
+            yield dict(current)
+
+
+def test_sync_picks_up_records_edited_during_the_previous_sync(tmp_path):
+    store = LocalStore(1, str(tmp_path / 'mirror.sqlite'))
+    harvest = FakeHarvest()
+    synchronizer = Synchronizer(harvest, store, logging.getLogger(__name__))
+
+    synchronizer.sync(['time_entries'])
+    assert [e['notes'] for e in store.iter_time_entries() if e['id'] == 1] == ['']
+
+    summary = synchronizer.sync(['time_entries'])
+    assert summary['time_entries']['deleted'] == 0
+    assert [e['notes'] for e in store.iter_time_entries() if e['id'] == 1] == ['edited']